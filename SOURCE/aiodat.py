@@ -0,0 +1,94 @@
+# aiodat.py
+# asyncio front end for the unpacker. Blocking work runs on one shared, bounded
+# thread pool so many archives can be served from one event loop.
+
+import os
+import queue
+import asyncio
+import concurrent.futures
+from typing import Optional, List, Dict, Tuple, AsyncIterator
+
+from functions import DatHashList, DatEntry, DatNameIndex, UnpackSession
+
+MAX_WORKERS = min(32, (os.cpu_count() or 4) * 4)
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None: _executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="aiodat")
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None: _executor.shutdown(wait=True); _executor = None
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+async def load_names() -> bool:
+    if not DatHashList._list_loaded: await run_blocking(DatHashList.iLoadProject)
+    return DatHashList._list_load_success
+
+class AsyncDatArchive:
+    def __init__(self, m_Archive: str, name_index: Optional[DatNameIndex] = None):
+        self.m_Session = UnpackSession(m_Archive, name_index=name_index)
+        self.m_ByHash: Dict[int, int] = {}
+
+    async def open(self) -> 'AsyncDatArchive':
+        await run_blocking(self.m_Session.open)
+        m_Hashes = self.m_Session.m_Table.m_Hashes
+        self.m_ByHash = {m_Hashes[i]: i for i in range(len(m_Hashes))}
+        return self
+
+    async def close(self): await run_blocking(self.m_Session.close)
+    async def __aenter__(self) -> 'AsyncDatArchive': return await self.open()
+    async def __aexit__(self, *exc_info): await self.close()
+
+    def __len__(self) -> int: return len(self.m_Session.m_Table) if self.m_Session.m_Table is not None else 0
+
+    def entry(self, dwHash: int) -> DatEntry:
+        if dwHash not in self.m_ByHash: raise KeyError(f"No entry with hash {dwHash:08X}.")
+        return self.m_Session.m_Table.entry(self.m_ByHash[dwHash])
+
+    async def entries(self) -> List[Tuple[DatEntry, str, str]]:
+        return await run_blocking(self.m_Session.resolve)
+
+    async def read(self, entry) -> bytes:
+        m_Entry = self.entry(entry) if isinstance(entry, int) else entry
+        def read_bytes() -> bytes:
+            with self.m_Session.read_view(m_Entry) as m_View: return m_View.tobytes()
+        return await run_blocking(read_bytes)
+
+async def extract(m_Archive: str, m_DstFolder: Optional[str] = None, interval: float = 0.1, **options) -> AsyncIterator[Dict[str, object]]:
+    # Yields progress snapshots until the session ends. Cancelling the consuming task, or leaving the loop early, cancels the
+    # session; the generator waits for the workers to stop, so the manifest on disk matches the files written.
+    if not await load_names(): raise RuntimeError("Hash list not loaded.")
+    output_queue: queue.Queue = queue.Queue()
+    m_Session = UnpackSession(m_Archive, m_DstFolder, **options)
+    def run_and_close() -> bool:
+        try: return m_Session.run(output_queue)
+        finally: m_Session.close()
+    m_Future = asyncio.ensure_future(run_blocking(run_and_close))
+    def snapshot() -> Dict[str, object]:
+        messages = []
+        while True:
+            try: item = output_queue.get_nowait()
+            except queue.Empty: break
+            if isinstance(item, list): messages.extend(item)
+            elif not isinstance(item, dict): messages.append(item)
+        return dict(m_Session.progress.snapshot(), state=m_Session.state, messages=messages)
+    try:
+        while not m_Future.done():
+            await asyncio.wait({m_Future}, timeout=interval)
+            yield snapshot()
+        await m_Future
+        yield snapshot()
+    finally:
+        if not m_Future.done():
+            m_Session.cancel()
+            await asyncio.shield(m_Future)
+
+async def extract_all(m_Archive: str, m_DstFolder: Optional[str] = None, **options) -> Dict[str, object]:
+    last: Dict[str, object] = {}
+    async for last in extract(m_Archive, m_DstFolder, **options): pass
+    return last
@@ -0,0 +1,272 @@
+# cedat.py
+# Command-line front end for the unpacker. Only depends on functions.py (and dds.py, imported by the commands that
+# need it) so it runs headless; start it with `python -m cedat` from this directory.
+
+import os
+import sys
+import re
+import csv
+import json
+import time
+import argparse
+import threading
+import contextlib
+from collections import Counter
+from typing import Optional, List
+
+from functions import DatHashList, DatProgress, DatUnpack, DatFilter, DatEntryTable, UnpackSession, DatCatalog, DatSearchIndex, DatBlobStoreSink, DatTarSink, DatZipSink, DatSqliteSink, DatNullSink, DatMemorySink, DatDirectorySink
+
+TEXTURE_COLUMNS = ("archive", "hash", "resolved_name", "width", "height", "mip_count", "pixel_format", "data_size", "size", "error")
+
+class ConsoleQueue:
+    def __init__(self, as_json: bool = False, quiet: bool = False, progress: bool = False):
+        self.as_json = as_json
+        self.quiet = quiet
+        self.progress = progress
+        self.errors = 0
+        self.m_Lock = threading.Lock()
+
+    def put(self, item):
+        # Extracted file names arrive in batches (lists); everything else is a single prefixed message.
+        if isinstance(item, list): self.write("file", item); return
+        if isinstance(item, dict): self.write_progress(item); return
+        item = str(item)
+        level = "file"
+        for prefix, name in (("FATAL", "error"), ("ERROR", "error"), ("WARNING", "warning"), ("INFO", "info")):
+            if item.startswith(prefix): level = name; break
+        self.write(level, [item])
+
+    def write_progress(self, m_Snapshot: dict):
+        with self.m_Lock:
+            if self.as_json: print(json.dumps(m_Snapshot), flush=True)
+            elif m_Snapshot["final"]: print(f"INFO: {m_Snapshot['archive']}: {DatProgress.iFormat(m_Snapshot)} in {m_Snapshot['elapsed']:.2f}s.", flush=True)
+            elif self.progress: print(f"{m_Snapshot['archive']}: {DatProgress.iFraction(m_Snapshot) * 100:5.1f}%  {DatProgress.iFormat(m_Snapshot)}", file=sys.stderr, flush=True)
+
+    def write(self, level: str, items: List[str]):
+        with self.m_Lock:
+            if level == "error": self.errors += len(items)
+            if self.quiet and level == "file": return
+            m_Stream = sys.stderr if level in ("error", "warning") and not self.as_json else sys.stdout
+            for item in items: print(json.dumps({"event": level, "message": item}) if self.as_json else item, file=m_Stream, flush=level != "file")
+
+def build_filter(args: argparse.Namespace) -> Optional[DatFilter]:
+    entry_filter = DatFilter(args.glob, args.regex, args.ext, args.min_size, args.max_size, [int(h, 16) for h in args.hash])
+    return None if entry_filter.is_empty() else entry_filter
+
+def load_names(args: argparse.Namespace):
+    if args.no_names: DatHashList._list_loaded = True; DatHashList._list_load_success = False
+    else: DatHashList.iLoadProject()
+
+def cmd_list(args: argparse.Namespace) -> int:
+    load_names(args)
+    m_Resolved, _ = DatUnpack.iListEntries(args.archive, build_filter(args))
+    if args.json:
+        json.dump([{"hash": f"{e.dwHash:08X}", "offset": e.dwOffset, "size": e.dwSize, "ext": ext, "name": path.replace(os.path.sep, '/')} for e, path, ext in m_Resolved], sys.stdout, indent=1)
+        print()
+    else:
+        for e, path, ext in m_Resolved: print(f"{e.dwHash:08X} {e.dwOffset:>10} {e.dwSize:>10}  {path.replace(os.path.sep, '/')}")
+    return 0
+
+def cmd_info(args: argparse.Namespace) -> int:
+    load_names(args)
+    m_Table = DatEntryTable.iLoad(args.archive)
+    m_Resolved = DatUnpack.iResolveEntries(args.archive, m_Table.entries())
+    info = {
+        "archive": os.path.abspath(args.archive),
+        "archive_size": os.path.getsize(args.archive),
+        "entries": len(m_Table),
+        "total_bytes": sum(m_Table.m_Sizes),
+        "named_entries": sum(1 for h in m_Table.m_Hashes if DatHashList.iGetNameFromHashList(h) is not None),
+        "types": dict(Counter(ext for _, _, ext in m_Resolved).most_common()),
+    }
+    if args.json: print(json.dumps(info, indent=1))
+    else:
+        for key, value in info.items():
+            if key == "types": value = ", ".join(f"{ext} {count}" for ext, count in value.items())
+            print(f"{key:>14}: {value}")
+    return 0
+
+def build_sink(args: argparse.Namespace):
+    if args.sink == "dir": return DatDirectorySink(args.output, not args.no_preallocate, args.drop_cache)
+    if args.store: return DatBlobStoreSink(args.store)
+    if args.tar: return DatTarSink(args.tar, DatTarSink.iGetCompression(args.tar))
+    if args.zip: return DatZipSink(args.zip)
+    if args.sqlite: return DatSqliteSink(args.sqlite)
+    if args.sink == "null": return DatNullSink()
+    if args.sink == "memory": return DatMemorySink()
+    return None
+
+def run_extraction(args: argparse.Namespace, m_Archives: List[str]) -> int:
+    has_target = any((args.output, args.store, args.tar, args.zip, args.sqlite))
+    if args.sink == "dir" and not args.output: raise ValueError("--sink dir needs an output folder (-o).")
+    if args.sink in ("null", "memory") and has_target: raise ValueError(f"--sink {args.sink} does not write anywhere; drop the output option.")
+    if not args.sink and not has_target: raise ValueError("one of -o, --store, --tar, --zip, --sqlite or --sink is required.")
+    if args.png and (not args.output or args.sink): raise ValueError("--png needs the default output folder (-o without --sink).")
+    m_Converter = None
+    if args.png:
+        from dds import DdsPngConverter, decoder_unavailable
+        if decoder_unavailable(): raise ValueError(decoder_unavailable())
+        m_Converter = DdsPngConverter(args.png == "all", args.png_workers)
+    load_names(args)
+    output_queue = ConsoleQueue(args.json, args.quiet, args.progress)
+    m_Sink = build_sink(args)
+    m_Target = args.output or args.store or os.path.dirname(os.path.abspath(args.tar or args.zip or args.sqlite or "."))
+    options = dict(preallocate=not args.no_preallocate, drop_cache=args.drop_cache, resume=args.resume, verify_digest=args.verify_digest,
+                   entry_filter=build_filter(args), workers=args.workers, dedup=args.dedup, sink=m_Sink, benchmark=args.bench)
+    if args.command == "extract": options["pipeline_bytes"] = args.pipeline * 1024 * 1024
+    start = time.perf_counter()
+    try:
+        if len(m_Archives) == 1 and args.command == "extract": DatUnpack.iDoIt(m_Archives[0], m_Target, output_queue, converter=m_Converter, **options)
+        else: DatUnpack.iDoItBatch(m_Archives, m_Target, output_queue, converter=m_Converter, **options)
+    finally:
+        if m_Sink is not None: m_Sink.close()
+        if m_Converter is not None: m_Converter.close()
+    output_queue.put(f"INFO: Finished in {time.perf_counter() - start:.2f}s.")
+    if isinstance(m_Sink, DatMemorySink): output_queue.put(f"INFO: Memory sink holds {len(m_Sink.m_Files)} files ({sum(map(len, m_Sink.m_Files.values()))} bytes).")
+    return 1 if output_queue.errors else 0
+
+def cmd_extract(args: argparse.Namespace) -> int: return run_extraction(args, [args.archive])
+
+def cmd_batch(args: argparse.Namespace) -> int: return run_extraction(args, args.archives)
+
+def cmd_search(args: argparse.Namespace) -> int:
+    load_names(args)
+    m_Index = DatSearchIndex([DatCatalog.iLoad(m_Archive) for m_Archive in args.archives])
+    m_Queries = [args.query] if args.query != "-" else (line.strip() for line in sys.stdin)
+    for query in m_Queries:
+        start = time.perf_counter()
+        m_Results = m_Index.search(query, args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        m_Rows = []
+        for entry_id in m_Results:
+            m_Catalog, index = m_Index.locate(entry_id)
+            m_Rows.append((os.path.basename(m_Catalog.m_Archive), m_Catalog.m_Hashes[index], m_Catalog.m_Sizes[index], m_Catalog.m_Names[index]))
+        if args.json: print(json.dumps({"query": query, "ms": round(elapsed_ms, 3), "matches": [{"archive": a, "hash": f"{h:08X}", "size": s, "name": n} for a, h, s, n in m_Rows]}), flush=True)
+        else:
+            for archive, dwHash, size, name in m_Rows: print(f"{archive}  {dwHash:08X} {size:>10}  {name}")
+            print(f"INFO: {len(m_Rows)} matches for '{query}' in {elapsed_ms:.2f} ms over {len(m_Index)} entries.", file=sys.stderr, flush=True)
+    return 0
+
+def write_textures_sqlite(m_DbPath: str, m_Rows: List[tuple]):
+    import sqlite3
+    with sqlite3.connect(m_DbPath) as m_Db:
+        m_Db.execute("CREATE TABLE IF NOT EXISTS textures (archive TEXT NOT NULL, hash INTEGER NOT NULL, resolved_name TEXT NOT NULL, width INTEGER, height INTEGER, "
+                     "mip_count INTEGER, pixel_format TEXT, data_size INTEGER, size INTEGER NOT NULL, error TEXT NOT NULL, UNIQUE (archive, resolved_name))")
+        m_Db.executemany(f"INSERT OR REPLACE INTO textures VALUES ({', '.join('?' * len(TEXTURE_COLUMNS))})", m_Rows)
+        m_Db.execute("CREATE INDEX IF NOT EXISTS textures_format ON textures (pixel_format)")
+    m_Db.close()
+
+def cmd_textures(args: argparse.Namespace) -> int:
+    # Metadata only: the 128-byte header of every .dds entry (plus the DX10 extension, if any) is read from the mapped archive, never the pixel data.
+    from dds import DdsHeader, scan_headers
+    load_names(args)
+    start = time.perf_counter(); m_Rows: List[tuple] = []
+    for m_Archive in args.archives:
+        with UnpackSession(m_Archive, entry_filter=build_filter(args)) as m_Session:
+            m_Textures = [(e, path) for e, path, ext in m_Session.resolve() if ext == ".dds" or path.lower().endswith(".dds")]
+            m_Headers = scan_headers(m_Session.m_Map if m_Session.m_Map is not None else b"", [(e.dwOffset, e.dwSize) for e, _ in m_Textures])
+        archive = os.path.basename(m_Archive)
+        for (e, path), m_Header in zip(m_Textures, m_Headers):
+            name = path.replace(os.path.sep, '/')
+            if not isinstance(m_Header, DdsHeader): m_Rows.append((archive, e.dwHash, name, None, None, None, None, None, e.dwSize, str(m_Header))); continue
+            needed = m_Header.data_offset + m_Header.data_size() if m_Header.data_size() is not None else 0
+            error = f"truncated: needs {needed} bytes" if e.dwSize < needed else ""
+            m_Rows.append((archive, e.dwHash, name, m_Header.width, m_Header.height, m_Header.mip_count, m_Header.pixel_format, m_Header.data_size(), e.dwSize, error))
+    elapsed = time.perf_counter() - start
+    if args.sqlite: write_textures_sqlite(args.sqlite, m_Rows)
+    elif args.csv:
+        with (open(args.csv, 'w', newline='', encoding='utf-8') if args.csv != "-" else contextlib.nullcontext(sys.stdout)) as f:
+            m_Writer = csv.writer(f); m_Writer.writerow(TEXTURE_COLUMNS)
+            m_Writer.writerows((row[0], f"{row[1]:08X}") + row[2:] for row in m_Rows)
+    elif args.json:
+        json.dump([dict(zip(TEXTURE_COLUMNS, (row[0], f"{row[1]:08X}") + row[2:])) for row in m_Rows], sys.stdout, indent=1)
+        print()
+    else:
+        for row in m_Rows:
+            if row[9] and row[3] is None: print(f"{row[1]:08X} {'-':>11} {'':>2} {'-':<7} {row[2]}  ({row[9]})")
+            else: print(f"{row[1]:08X} {row[3]:>5}x{row[4]:<5} {row[5]:>2} {row[6]:<7} {row[2]}" + (f"  ({row[9]})" if row[9] else ""))
+    m_Formats = Counter(row[6] for row in m_Rows if row[6] is not None)
+    print(f"INFO: {len(m_Rows)} textures in {elapsed:.2f}s ({', '.join(f'{fmt} {count}' for fmt, count in m_Formats.most_common()) or 'none'}), "
+          f"{sum(1 for row in m_Rows if row[9])} with errors.", file=sys.stderr, flush=True)
+    return 0
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    load_names(args)
+    m_Results = DatUnpack.iVerify(args.archive, args.output, build_filter(args))
+    failures = [(path, status) for path, status in m_Results if status != "ok"]
+    if args.json: print(json.dumps({"checked": len(m_Results), "failures": [{"name": p.replace(os.path.sep, '/'), "status": s} for p, s in failures]}, indent=1))
+    else:
+        for path, status in failures: print(f"{status}: {path}")
+        print(f"{len(m_Results) - len(failures)} of {len(m_Results)} entries match.")
+    return 1 if failures else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cedat", description="Extract DAT archives from Pivotal Games titles.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="machine-readable output")
+    common.add_argument("--no-names", action="store_true", help="skip loading the hash list; every entry goes to __Unknown")
+    filters = common.add_argument_group("filters")
+    filters.add_argument("--glob", action="append", default=[], help="name glob, e.g. '*.DDS' (repeatable)")
+    filters.add_argument("--regex", action="append", default=[], help="name regular expression (repeatable)")
+    filters.add_argument("--ext", action="append", default=[], help="detected extension, e.g. dds (repeatable)")
+    filters.add_argument("--hash", action="append", default=[], help="entry hash in hex (repeatable)")
+    filters.add_argument("--min-size", type=int, default=None)
+    filters.add_argument("--max-size", type=int, default=None)
+    archive = argparse.ArgumentParser(add_help=False)
+    archive.add_argument("archive", help="path to the .dat archive")
+    writing = argparse.ArgumentParser(add_help=False)
+    target = writing.add_mutually_exclusive_group()
+    target.add_argument("-o", "--output", help="output folder")
+    target.add_argument("--store", help="content-addressed blob store folder shared between archives")
+    target.add_argument("--tar", help="write one tar file instead of a folder (.tar.gz/.tar.bz2/.tar.xz compress)")
+    target.add_argument("--zip", help="write one zip file instead of a folder")
+    target.add_argument("--sqlite", help="write every entry as a row of one SQLite database")
+    writing.add_argument("--sink", choices=["dir", "null", "memory"],
+                         help="dir: plain files under -o, without manifest, resume or dedup; null: read entries without writing them; memory: keep them in RAM")
+    writing.add_argument("-q", "--quiet", action="store_true", help="do not print extracted file names")
+    writing.add_argument("--resume", action="store_true", help="skip entries the manifest marks as unchanged")
+    writing.add_argument("--verify-digest", action="store_true", help="with --resume, also compare digests")
+    writing.add_argument("--drop-cache", action="store_true", help="drop written pages from the page cache")
+    writing.add_argument("--no-preallocate", action="store_true")
+    writing.add_argument("--dedup", action="store_true", help="write identical entries once and hardlink the rest")
+    writing.add_argument("--progress", action="store_true", help="print throughput and ETA to stderr while extracting (always on with --json)")
+    writing.add_argument("--bench", action="store_true", help="report time spent on index, detect, plan, read and write per archive")
+    writing.add_argument("--png", choices=["mip0", "all"], help="also convert extracted .dds files to PNG next to them, top level only or every mip (needs NumPy)")
+    writing.add_argument("--png-workers", type=int, default=0, metavar="N", help="processes for --png (default: one per CPU)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", parents=[archive, common], help="list entries").set_defaults(func=cmd_list)
+    commands.add_parser("info", parents=[archive, common], help="summarise an archive").set_defaults(func=cmd_info)
+    extract = commands.add_parser("extract", parents=[archive, common, writing], help="extract entries")
+    extract.add_argument("-j", "--workers", type=int, default=1)
+    extract.add_argument("--pipeline", type=int, default=0, metavar="MIB", help="read ahead of the -j writer threads, holding at most MIB mebibytes")
+    extract.set_defaults(func=cmd_extract)
+    batch = commands.add_parser("batch", parents=[common, writing], help="extract many archives, one sub-folder each, with one worker pool")
+    batch.add_argument("archives", nargs="+", help="paths to .dat archives")
+    batch.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 4)
+    batch.set_defaults(func=cmd_batch)
+    search = commands.add_parser("search", help="find entries by name text, ext:TYPE or 0xHASH prefix across archives")
+    search.add_argument("query", help="search terms, or - to read one query per line from stdin")
+    search.add_argument("archives", nargs="+", help="paths to .dat archives")
+    search.add_argument("--limit", type=int, default=None)
+    search.add_argument("--json", action="store_true", help="machine-readable output")
+    search.add_argument("--no-names", action="store_true", help="skip loading the hash list")
+    search.set_defaults(func=cmd_search)
+    textures = commands.add_parser("textures", parents=[common], help="list size, mip count and pixel format of every .dds entry without extracting")
+    textures.add_argument("archives", nargs="+", help="paths to .dat archives")
+    textures_out = textures.add_mutually_exclusive_group()
+    textures_out.add_argument("--csv", metavar="FILE", help="write a CSV table ('-' for stdout)")
+    textures_out.add_argument("--sqlite", metavar="DB", help="write table textures(archive, hash, resolved_name, width, height, mip_count, pixel_format, data_size, size, error)")
+    textures.set_defaults(func=cmd_textures)
+    verify = commands.add_parser("verify", parents=[archive, common], help="compare an output folder against the archive")
+    verify.add_argument("-o", "--output", required=True, help="output folder")
+    verify.set_defaults(func=cmd_verify)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try: return args.func(args)
+    except FileNotFoundError as e: print(f"ERROR: {e}", file=sys.stderr); return 2
+    except (ValueError, OSError, re.error) as e: print(f"ERROR: {e}", file=sys.stderr); return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+# dds.py
+# DDS header parsing and BC1/BC2/BC3 (DXT1/DXT3/DXT5) decoding. The header parser is stdlib only and also sizes BC4-BC7
+# and the DX10 formats it knows. Decoding needs NumPy and works on a whole mip level at once, so every 4x4 block of the
+# level is unpacked by the same array operations.
+
+import os
+import mmap
+import zlib
+import struct
+import threading
+import multiprocessing
+import concurrent.futures
+from typing import Optional, List, Dict, Tuple, Union
+
+# NumPy is imported by load_numpy() the first time pixels are decoded, so header scans never pay for it.
+np = None
+_numpy_checked = False
+
+DDS_MAGIC = b"DDS "
+HEADER_SIZE = 128
+DX10_HEADER_SIZE = 20
+DDSD_MIPMAPCOUNT = 0x20000
+DDPF_ALPHAPIXELS = 0x1
+DDPF_FOURCC = 0x4
+DDPF_RGB = 0x40
+DDPF_LUMINANCE = 0x20000
+BLOCK_BYTES = {"DXT1": 8, "DXT2": 16, "DXT3": 16, "DXT4": 16, "DXT5": 16, "ATI1": 8, "BC4U": 8, "BC4S": 8, "ATI2": 16, "BC5U": 16, "BC5S": 16,
+               "BC1": 8, "BC2": 16, "BC3": 16, "BC4": 8, "BC5": 16, "BC6H": 16, "BC7": 16}
+# Block formats decode_level handles, by how their alpha is stored.
+BLOCK_ALPHA = {"DXT1": "", "BC1": "", "DXT2": "explicit", "DXT3": "explicit", "BC2": "explicit", "DXT4": "interpolated", "DXT5": "interpolated", "BC3": "interpolated"}
+# dxgiFormat values of the DX10 header: typeless, unorm and srgb variants share a name.
+DXGI_BLOCK_FORMATS = {70: "BC1", 71: "BC1", 72: "BC1", 73: "BC2", 74: "BC2", 75: "BC2", 76: "BC3", 77: "BC3", 78: "BC3", 79: "BC4", 80: "BC4", 81: "BC4",
+                      82: "BC5", 83: "BC5", 84: "BC5", 94: "BC6H", 95: "BC6H", 96: "BC6H", 97: "BC7", 98: "BC7", 99: "BC7"}
+DXGI_MASKED_FORMATS = {27: ("RGBA32", 32, (0xFF, 0xFF00, 0xFF0000, 0xFF000000)), 28: ("RGBA32", 32, (0xFF, 0xFF00, 0xFF0000, 0xFF000000)),
+                       29: ("RGBA32", 32, (0xFF, 0xFF00, 0xFF0000, 0xFF000000)), 87: ("RGBA32", 32, (0xFF0000, 0xFF00, 0xFF, 0xFF000000)),
+                       90: ("RGBA32", 32, (0xFF0000, 0xFF00, 0xFF, 0xFF000000)), 91: ("RGBA32", 32, (0xFF0000, 0xFF00, 0xFF, 0xFF000000)),
+                       88: ("RGB32", 32, (0xFF0000, 0xFF00, 0xFF, 0)), 92: ("RGB32", 32, (0xFF0000, 0xFF00, 0xFF, 0)), 93: ("RGB32", 32, (0xFF0000, 0xFF00, 0xFF, 0)),
+                       85: ("RGB16", 16, (0xF800, 0x7E0, 0x1F, 0)), 86: ("RGBA16", 16, (0x7C00, 0x3E0, 0x1F, 0x8000)), 61: ("L8", 8, (0xFF, 0, 0, 0))}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class DdsError(ValueError): pass
+
+def load_numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try: import numpy as np
+        except ImportError: np = None
+        _numpy_checked = True
+    return np
+
+def decoder_unavailable() -> str: return "" if load_numpy() is not None else "DDS decoding needs NumPy: pip install numpy"
+
+class DdsHeader:
+    HEADER_FORMAT = struct.Struct('<4s7I44x2I4s5I4I4x')
+
+    def __init__(self, width: int, height: int, mip_count: int, pixel_format: str, bit_count: int = 0,
+                 masks: Tuple[int, int, int, int] = (0, 0, 0, 0), data_offset: int = HEADER_SIZE):
+        self.width = width
+        self.height = height
+        self.mip_count = mip_count
+        self.pixel_format = pixel_format
+        self.bit_count = bit_count
+        self.masks = masks
+        self.data_offset = data_offset
+        self.dxgi_format: Optional[int] = None
+
+    @staticmethod
+    def iParse(m_Data) -> 'DdsHeader':
+        if len(m_Data) < HEADER_SIZE: raise DdsError("Not a DDS file.")
+        header = DdsHeader.iFromFields(DdsHeader.HEADER_FORMAT.unpack_from(m_Data))
+        if header.pixel_format == "DX10":
+            if len(m_Data) < HEADER_SIZE + DX10_HEADER_SIZE: raise DdsError("DDS DX10 header is truncated.")
+            header.apply_dx10(struct.unpack_from('<I', m_Data, HEADER_SIZE)[0])
+        return header
+
+    @staticmethod
+    def iFromFields(m_Fields: tuple) -> 'DdsHeader':
+        (magic, size, flags, height, width, _, _, mip_count, _, pf_flags, fourcc, bit_count,
+         r_mask, g_mask, b_mask, a_mask, _, _, _, _) = m_Fields
+        if magic != DDS_MAGIC: raise DdsError("Not a DDS file.")
+        if size != 124: raise DdsError(f"Bad DDS header size {size}.")
+        if width == 0 or height == 0: raise DdsError("DDS has no pixels.")
+        data_offset = HEADER_SIZE
+        if pf_flags & DDPF_FOURCC:
+            pixel_format = fourcc.rstrip(b'\0').decode('ascii', 'replace'); bit_count = 0
+            if pixel_format == "DX10": data_offset += DX10_HEADER_SIZE
+        elif pf_flags & DDPF_RGB: pixel_format = ("RGBA" if pf_flags & DDPF_ALPHAPIXELS and a_mask else "RGB") + str(bit_count)
+        elif pf_flags & DDPF_LUMINANCE: pixel_format = ("LA" if pf_flags & DDPF_ALPHAPIXELS and a_mask else "L") + str(bit_count)
+        else: pixel_format = "UNKNOWN"
+        # Some exporters fill in the count without setting the flag; the count is also capped by the size of the top level.
+        mip_count = max(1, min(mip_count, max(width, height).bit_length())) if flags & DDSD_MIPMAPCOUNT or mip_count > 1 else 1
+        return DdsHeader(width, height, mip_count, pixel_format, bit_count, (r_mask, g_mask, b_mask, a_mask), data_offset)
+
+    def apply_dx10(self, dxgi_format: int):
+        self.dxgi_format = dxgi_format
+        if dxgi_format in DXGI_BLOCK_FORMATS: self.pixel_format = DXGI_BLOCK_FORMATS[dxgi_format]
+        elif dxgi_format in DXGI_MASKED_FORMATS: self.pixel_format, self.bit_count, self.masks = DXGI_MASKED_FORMATS[dxgi_format]
+        else: self.pixel_format = f"DXGI{dxgi_format}"
+
+    def is_block_compressed(self) -> bool: return self.pixel_format in BLOCK_BYTES
+
+    def has_known_size(self) -> bool: return self.is_block_compressed() or self.bit_count > 0
+
+    def level_dims(self, level: int) -> Tuple[int, int]: return max(1, self.width >> level), max(1, self.height >> level)
+
+    def level_size(self, level: int) -> int:
+        width, height = self.level_dims(level)
+        if self.is_block_compressed(): return ((width + 3) // 4) * ((height + 3) // 4) * BLOCK_BYTES[self.pixel_format]
+        return width * height * (self.bit_count // 8)
+
+    def level_offset(self, level: int) -> int: return self.data_offset + sum(self.level_size(i) for i in range(level))
+
+    def data_size(self) -> Optional[int]:
+        # None for formats whose layout is unknown here (other FourCCs, unlisted DXGI formats): nothing to check against.
+        return sum(self.level_size(i) for i in range(self.mip_count)) if self.has_known_size() else None
+
+    def levels(self) -> List[Tuple[int, int, int, int]]:
+        # (width, height, offset, size) for every mip level, top level first.
+        m_Levels = []; offset = self.data_offset
+        for level in range(self.mip_count):
+            width, height = self.level_dims(level); size = self.level_size(level)
+            m_Levels.append((width, height, offset, size)); offset += size
+        return m_Levels
+
+def scan_headers(m_Buffer, m_Ranges: List[Tuple[int, int]]) -> List[Union[DdsHeader, DdsError]]:
+    # Only the first 128 bytes of each (offset, size) range are read: they are gathered into one buffer and decoded in a
+    # single iter_unpack pass. Entries that are not DDS come back as the DdsError explaining why.
+    m_Usable = [size >= HEADER_SIZE and offset + HEADER_SIZE <= len(m_Buffer) for offset, size in m_Ranges]
+    m_Joined = b"".join(m_Buffer[offset:offset + HEADER_SIZE] for (offset, _), usable in zip(m_Ranges, m_Usable) if usable)
+    m_Fields = DdsHeader.HEADER_FORMAT.iter_unpack(m_Joined)
+    m_Results: List[Union[DdsHeader, DdsError]] = []
+    for usable in m_Usable:
+        if not usable: m_Results.append(DdsError("Entry is smaller than a DDS header.")); continue
+        try: m_Results.append(DdsHeader.iFromFields(next(m_Fields)))
+        except DdsError as header_err: m_Results.append(header_err)
+    # The DX10 extension follows the header; it is read for the few entries that have one.
+    for index, m_Header in enumerate(m_Results):
+        if not isinstance(m_Header, DdsHeader) or m_Header.pixel_format != "DX10": continue
+        offset, size = m_Ranges[index]
+        if size < HEADER_SIZE + DX10_HEADER_SIZE or offset + HEADER_SIZE + 4 > len(m_Buffer): m_Results[index] = DdsError("DDS DX10 header is truncated."); continue
+        m_Header.apply_dx10(struct.unpack('<I', m_Buffer[offset + HEADER_SIZE:offset + HEADER_SIZE + 4])[0])
+    return m_Results
+
+def _expand_565(m_Colors) -> 'np.ndarray':
+    m_Colors = m_Colors.astype(np.uint32)
+    red, green, blue = (m_Colors >> 11) & 31, (m_Colors >> 5) & 63, m_Colors & 31
+    red, green, blue = (red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2)
+    return np.stack((red, green, blue), axis=-1)
+
+def _decode_color_blocks(m_Blocks, four_color_only: bool) -> 'np.ndarray':
+    # m_Blocks: (n, 8) uint8 colour blocks. Returns (n, 16, 4) uint8 RGBA in block row-major order.
+    count = len(m_Blocks)
+    m_Words = m_Blocks.view('<u2')
+    color0, color1 = m_Words[:, 0], m_Words[:, 1]
+    m_Selectors = m_Blocks[:, 4:8].copy().view('<u4')[:, 0]
+    rgb0, rgb1 = _expand_565(color0), _expand_565(color1)
+    m_Palette = np.empty((count, 4, 4), dtype=np.uint8)
+    m_Palette[:, 0, :3] = rgb0; m_Palette[:, 1, :3] = rgb1
+    m_Palette[:, :, 3] = 255
+    four_color = np.ones(count, dtype=bool) if four_color_only else color0 > color1
+    m_Four = four_color[:, None]
+    m_Palette[:, 2, :3] = np.where(m_Four, (2 * rgb0 + rgb1) // 3, (rgb0 + rgb1) // 2)
+    m_Palette[:, 3, :3] = np.where(m_Four, (rgb0 + 2 * rgb1) // 3, 0)
+    m_Palette[:, 3, 3] = np.where(four_color, 255, 0)
+    m_Indices = (m_Selectors[:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return m_Palette[np.arange(count)[:, None], m_Indices]
+
+def _decode_explicit_alpha(m_Blocks) -> 'np.ndarray':
+    m_Bits = m_Blocks.copy().view('<u8')[:, 0]
+    return (((m_Bits[:, None] >> (4 * np.arange(16, dtype=np.uint64))) & 15) * 17).astype(np.uint8)
+
+def _decode_interpolated_alpha(m_Blocks) -> 'np.ndarray':
+    count = len(m_Blocks)
+    alpha0, alpha1 = m_Blocks[:, 0].astype(np.uint32), m_Blocks[:, 1].astype(np.uint32)
+    m_Bits = np.zeros(count, dtype=np.uint64)
+    for byte_index in range(6): m_Bits |= m_Blocks[:, 2 + byte_index].astype(np.uint64) << np.uint64(8 * byte_index)
+    m_Steps = np.arange(1, 7, dtype=np.uint32)
+    m_Palette = np.empty((count, 8), dtype=np.uint32)
+    m_Palette[:, 0] = alpha0; m_Palette[:, 1] = alpha1
+    m_Eight = ((7 - m_Steps) * alpha0[:, None] + m_Steps * alpha1[:, None]) // 7
+    m_Six = ((5 - m_Steps[:4]) * alpha0[:, None] + m_Steps[:4] * alpha1[:, None]) // 5
+    m_Six = np.concatenate((m_Six, np.zeros((count, 1), np.uint32), np.full((count, 1), 255, np.uint32)), axis=1)
+    m_Palette[:, 2:] = np.where((alpha0 > alpha1)[:, None], m_Eight, m_Six)
+    m_Indices = ((m_Bits[:, None] >> (3 * np.arange(16, dtype=np.uint64))) & 7).astype(np.intp)
+    return m_Palette[np.arange(count)[:, None], m_Indices].astype(np.uint8)
+
+def _decode_masked(m_Data, header: DdsHeader, width: int, height: int) -> 'np.ndarray':
+    pixel_bytes = header.bit_count // 8
+    if pixel_bytes not in (1, 2, 3, 4): raise DdsError(f"Unsupported bit count {header.bit_count}.")
+    m_Raw = np.frombuffer(m_Data, dtype=np.uint8, count=width * height * pixel_bytes).reshape(-1, pixel_bytes).astype(np.uint32)
+    m_Values = np.zeros(len(m_Raw), dtype=np.uint32)
+    for byte_index in range(pixel_bytes): m_Values |= m_Raw[:, byte_index] << (8 * byte_index)
+    m_Image = np.empty((len(m_Values), 4), dtype=np.uint8)
+    full_mask = (1 << header.bit_count) - 1
+    for channel, mask in enumerate(header.masks):
+        # Masks wider than the pixel are ignored; a luminance mask lost that way falls back to the low byte.
+        mask &= full_mask
+        if mask == 0 and channel == 0 and header.pixel_format.startswith("L"): mask = 0xFF
+        if mask == 0: m_Image[:, channel] = 255 if channel == 3 else 0; continue
+        shift = (mask & -mask).bit_length() - 1; top = mask >> shift
+        m_Image[:, channel] = ((m_Values & mask) >> shift) * 255 // top
+    if header.pixel_format.startswith("L"): m_Image[:, 1] = m_Image[:, 2] = m_Image[:, 0]
+    return m_Image.reshape(height, width, 4)
+
+def decode_level(m_Data, header: DdsHeader = None, level: int = 0) -> 'np.ndarray':
+    # Returns the level as a (height, width, 4) uint8 RGBA array. m_Data may be a memoryview of the archive; it is only read.
+    if load_numpy() is None: raise RuntimeError(decoder_unavailable())
+    if header is None: header = DdsHeader.iParse(m_Data)
+    if not 0 <= level < header.mip_count: raise DdsError(f"Mip level {level} out of range (0-{header.mip_count - 1}).")
+    if header.pixel_format not in BLOCK_ALPHA and not (header.bit_count and header.pixel_format[0] in "RL"): raise DdsError(f"Unsupported DDS format {header.pixel_format}.")
+    width, height = header.level_dims(level)
+    offset, size = header.level_offset(level), header.level_size(level)
+    if offset + size > len(m_Data): raise DdsError("DDS data is truncated.")
+    m_Level = memoryview(m_Data)[offset:offset + size]
+    if header.pixel_format not in BLOCK_ALPHA: return _decode_masked(m_Level, header, width, height)
+    block_bytes = BLOCK_BYTES[header.pixel_format]
+    blocks_x, blocks_y = (width + 3) // 4, (height + 3) // 4
+    m_Blocks = np.frombuffer(m_Level, dtype=np.uint8).reshape(-1, block_bytes)
+    if block_bytes == 8: m_Pixels = _decode_color_blocks(m_Blocks, False)
+    else:
+        m_Pixels = _decode_color_blocks(m_Blocks[:, 8:], True)
+        m_Pixels[:, :, 3] = _decode_explicit_alpha(m_Blocks[:, :8]) if BLOCK_ALPHA[header.pixel_format] == "explicit" else _decode_interpolated_alpha(m_Blocks[:, :8])
+    m_Image = m_Pixels.reshape(blocks_y, blocks_x, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(blocks_y * 4, blocks_x * 4, 4)
+    return m_Image[:height, :width]
+
+def decode_levels(m_Data, header: DdsHeader = None) -> List['np.ndarray']:
+    if header is None: header = DdsHeader.iParse(m_Data)
+    return [decode_level(m_Data, header, level) for level in range(header.mip_count)]
+
+def _png_chunk(tag: bytes, m_Data: bytes) -> bytes:
+    return struct.pack('>I', len(m_Data)) + tag + m_Data + struct.pack('>I', zlib.crc32(m_Data, zlib.crc32(tag)))
+
+def encode_png(m_Pixels: 'np.ndarray', compress_level: int = 6) -> bytes:
+    # RGBA8 PNG from a (height, width, 4) array. Every row uses the Sub filter, computed for the whole image in one subtraction.
+    if load_numpy() is None: raise RuntimeError(decoder_unavailable())
+    height, width = m_Pixels.shape[:2]
+    m_Rows = np.ascontiguousarray(m_Pixels, dtype=np.uint8).reshape(height, width * 4)
+    m_Filtered = np.empty((height, width * 4 + 1), dtype=np.uint8)
+    m_Filtered[:, 0] = 1
+    m_Filtered[:, 1:5] = m_Rows[:, :4]
+    np.subtract(m_Rows[:, 4:], m_Rows[:, :-4], out=m_Filtered[:, 5:])
+    return (PNG_SIGNATURE + _png_chunk(b"IHDR", struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + _png_chunk(b"IDAT", zlib.compress(m_Filtered.tobytes(), compress_level)) + _png_chunk(b"IEND", b""))
+
+_archive_maps: Dict[str, mmap.mmap] = {}
+
+def convert_entry(m_Archive: str, dwOffset: int, dwSize: int, m_PngBase: str, all_mips: bool = False, compress_level: int = 6) -> int:
+    # Runs in a worker process. Only the entry's location crosses the process boundary; the texture is read from this
+    # process's own map of the archive. Mip 0 goes to <base>.png, further levels to <base>.mip<N>.png.
+    m_Map = _archive_maps.get(m_Archive)
+    if m_Map is None:
+        with open(m_Archive, 'rb') as f: m_Map = _archive_maps[m_Archive] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if dwOffset + dwSize > len(m_Map): raise DdsError("Entry runs past the end of the archive.")
+    m_View = memoryview(m_Map)[dwOffset:dwOffset + dwSize]
+    m_Header = DdsHeader.iParse(m_View)
+    level_count = m_Header.mip_count if all_mips else 1
+    for level in range(level_count):
+        m_Png = encode_png(decode_level(m_View, m_Header, level), compress_level)
+        with open(m_PngBase + (f".mip{level}.png" if level else ".png"), 'wb') as f: f.write(m_Png)
+    return level_count
+
+class DdsPngConverter:
+    # Converts extracted .dds entries to PNG in a process pool while extraction carries on. One converter can serve many
+    # sessions; each session waits for its own conversions when it finishes, and whoever created the converter closes it.
+    def __init__(self, all_mips: bool = False, workers: int = 0, compress_level: int = 6):
+        self.all_mips = all_mips
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        self.compress_level = compress_level
+        self.m_Lock = threading.Lock()
+        self.m_Pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self.m_Futures: Dict[object, List[concurrent.futures.Future]] = {}
+
+    def submit(self, session, entry, relative_path_os: str, m_FullPath: str, output_queue):
+        with self.m_Lock:
+            if self.m_Pool is None:
+                # Spawned, not forked: the extractor's threads may hold locks at the moment the pool starts.
+                self.m_Pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            m_Future = self.m_Pool.submit(convert_entry, session.m_Archive, entry.dwOffset, entry.dwSize, os.path.splitext(m_FullPath)[0], self.all_mips, self.compress_level)
+            self.m_Futures.setdefault(session, []).append(m_Future)
+        def done(m_Future: concurrent.futures.Future):
+            if not m_Future.cancelled() and m_Future.exception() is not None:
+                session.report_error(f"ERROR converting {relative_path_os}: {m_Future.exception()}", output_queue)
+        m_Future.add_done_callback(done)
+
+    def wait(self, session, output_queue, cancel: bool = False):
+        with self.m_Lock: m_Futures = self.m_Futures.pop(session, [])
+        if cancel:
+            for m_Future in m_Futures: m_Future.cancel()
+        concurrent.futures.wait(m_Futures)
+        converted = sum(1 for m_Future in m_Futures if not m_Future.cancelled() and m_Future.exception() is None)
+        if m_Futures: output_queue.put(f"INFO: Converted {converted} DDS textures to PNG ({os.path.basename(session.m_Archive)}).")
+
+    def close(self):
+        with self.m_Lock: m_Pool = self.m_Pool; self.m_Pool = None
+        if m_Pool is not None: m_Pool.shutdown(wait=True, cancel_futures=True)
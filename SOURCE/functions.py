@@ -12,6 +12,17 @@ import threading
 import traceback
 import time
 import queue
+import mmap
+import concurrent.futures
+import tarfile
+import zipfile
+import json
+import hashlib
+import re
+import fnmatch
+import bisect
+from array import array
+from collections import Counter, deque
 from typing import Optional, Dict, List, Tuple
 
 try:
@@ -33,6 +44,89 @@ class DatEntry:
         self.dwOffset: int = dwOffset
         self.dwSize: int = dwSize
 
+class DatEntryTable:
+    INDEX_CHUNK = 12 * 4096
+
+    def __init__(self):
+        self.m_Hashes = array('I')
+        self.m_Offsets = array('I')
+        self.m_Sizes = array('q')
+
+    def __len__(self) -> int: return len(self.m_Hashes)
+
+    def entry(self, index: int) -> DatEntry: return DatEntry(self.m_Hashes[index], self.m_Offsets[index], self.m_Sizes[index])
+
+    def entries(self, indices: Optional[List[int]] = None) -> List[DatEntry]:
+        if indices is None: indices = range(len(self))
+        return [DatEntry(self.m_Hashes[i], self.m_Offsets[i], self.m_Sizes[i]) for i in indices]
+
+    @staticmethod
+    def iLoad(m_Archive: str) -> 'DatEntryTable':
+        with open(m_Archive, 'rb') as TDatStream: return DatEntryTable.iLoadStream(TDatStream)
+
+    @staticmethod
+    def iLoadStream(TDatStream: io.BufferedIOBase) -> 'DatEntryTable':
+        m_Table = DatEntryTable()
+        TDatStream.seek(0)
+        while True:
+            index_data = TDatStream.read(DatEntryTable.INDEX_CHUNK)
+            usable = len(index_data) - len(index_data) % 12
+            for dwHash, dwOffset, dwSize in struct.iter_unpack('<IIi', index_data[:usable]):
+                if dwHash == 0 and dwOffset == 0 and dwSize == 0: return m_Table
+                if dwSize < 0: continue
+                m_Table.m_Hashes.append(dwHash); m_Table.m_Offsets.append(dwOffset); m_Table.m_Sizes.append(dwSize)
+            if usable < DatEntryTable.INDEX_CHUNK: return m_Table
+
+class DatFilter:
+    def __init__(self, globs: Optional[List[str]] = None, regexes: Optional[List[str]] = None, exts: Optional[List[str]] = None,
+                 min_size: Optional[int] = None, max_size: Optional[int] = None, hashes: Optional[List[int]] = None):
+        self.globs = list(globs or [])
+        self.regexes = list(regexes or [])
+        self.exts = {("." + ext.lstrip(".")).lower() for ext in (exts or []) if ext.strip(".")}
+        self.min_size = min_size
+        self.max_size = max_size
+        self.hashes = set(hashes or [])
+        # Globs must match the whole name; user regexes match anywhere in it, like re.search.
+        m_Globs = [fnmatch.translate(glob.replace('\\', '/')) for glob in self.globs]
+        self._glob_pattern = re.compile("|".join(f"(?:{p})" for p in m_Globs), re.IGNORECASE) if m_Globs else None
+        self._regex_pattern = re.compile("|".join(f"(?:{regex})" for regex in self.regexes), re.IGNORECASE) if self.regexes else None
+
+    @staticmethod
+    def iSplit(m_String: str) -> List[str]: return [part for part in re.split(r"[,;\s]+", m_String or "") if part]
+
+    @staticmethod
+    def iFromStrings(globs: str = "", regex: str = "", exts: str = "", hashes: str = "", min_size: int = 0, max_size: int = 0) -> 'DatFilter':
+        return DatFilter(DatFilter.iSplit(globs), [regex] if regex else [], DatFilter.iSplit(exts),
+                         min_size if min_size > 0 else None, max_size if max_size > 0 else None,
+                         [int(h, 16) for h in DatFilter.iSplit(hashes)])
+
+    def is_empty(self) -> bool:
+        return not self.has_name_pattern() and not self.exts and self.min_size is None and self.max_size is None and not self.hashes
+
+    def has_name_pattern(self) -> bool: return self._glob_pattern is not None or self._regex_pattern is not None
+
+    def has_name_terms(self) -> bool: return self.has_name_pattern() or bool(self.exts)
+
+    def matches_name(self, name: str) -> bool:
+        return ((self._glob_pattern is not None and self._glob_pattern.match(name) is not None) or
+                (self._regex_pattern is not None and self._regex_pattern.search(name) is not None))
+
+    def iMaskIndex(self, m_Table: DatEntryTable) -> List[bool]:
+        mask = [True] * len(m_Table)
+        if self.hashes: mask = [m and h in self.hashes for m, h in zip(mask, m_Table.m_Hashes)]
+        if self.min_size is not None: mask = [m and s >= self.min_size for m, s in zip(mask, m_Table.m_Sizes)]
+        if self.max_size is not None: mask = [m and s <= self.max_size for m, s in zip(mask, m_Table.m_Sizes)]
+        return mask
+
+    def iMaskNames(self, m_Paths: List[str], m_Exts: List[str], m_KnownNames: List[Optional[str]]) -> List[bool]:
+        mask = [True] * len(m_Paths)
+        if self.exts: mask = [m and e.lower() in self.exts for m, e in zip(mask, m_Exts)]
+        if self.has_name_pattern():
+            match = self.matches_name
+            mask = [m and (match(p.replace(os.path.sep, '/')) or (k is not None and match(k.replace('\\', '/'))))
+                    for m, p, k in zip(mask, m_Paths, m_KnownNames)]
+        return mask
+
 class Utils:
     @staticmethod
     def iGetApplicationPath() -> str: return str(pathlib.Path(__file__).parent.resolve())
@@ -54,6 +148,18 @@ class Utils:
         try:
              if dir_name: os.makedirs(dir_name, exist_ok=True)
         except Exception: pass
+    @staticmethod
+    def iCreateDirectoryPlan(m_Root: str, m_FullPaths: List[str]) -> Tuple[int, int]:
+        m_Root = os.path.normpath(m_Root); m_Dirs = set()
+        for m_FullPath in m_FullPaths:
+            dir_name = os.path.dirname(m_FullPath)
+            while len(dir_name) > len(m_Root) and dir_name not in m_Dirs:
+                m_Dirs.add(dir_name); dir_name = os.path.dirname(dir_name)
+        for dir_name in sorted(m_Dirs, key=lambda d: (d.count(os.path.sep), d)):
+            try: os.mkdir(dir_name)
+            except FileExistsError: pass
+            except Exception: pass
+        return len(m_Dirs), len(m_FullPaths)
 
 class Helpers:
     @staticmethod
@@ -204,7 +310,8 @@ class DatHashList:
     def iLoadProject():
         if DatHashList._list_loaded: return
         DatHashList.update_load_progress(0, 1)
-        DatHashList.m_HashList.clear()
+        # Built aside and published at the end, so a DatNameIndex shared with running sessions never changes under them.
+        m_HashList: Dict[int, str] = {}
         i = 0; processed_count = 0; total_count = 0; load_error = False
         if imported_filename_list is None: load_error = True
         elif not imported_filename_list: load_error = False; total_count = 0
@@ -215,8 +322,8 @@ class DatHashList:
                 if not isinstance(m_Line_Stripped, str) or not m_Line_Stripped: continue
                 dwHashLower = DatHash.iGetHash(m_Line_Stripped.lower())
                 dwHashUpper = DatHash.iGetHash(m_Line_Stripped.upper())
-                DatHashList.m_HashList[dwHashLower] = m_Line_Stripped
-                if dwHashUpper != dwHashLower: DatHashList.m_HashList[dwHashUpper] = m_Line_Stripped
+                m_HashList[dwHashLower] = m_Line_Stripped
+                if dwHashUpper != dwHashLower: m_HashList[dwHashUpper] = m_Line_Stripped
                 i += 1
                 processed_count = line_num + 1
                 if processed_count % update_interval == 0 or processed_count == total_count:
@@ -224,6 +331,7 @@ class DatHashList:
         if not load_error and i > 0: DatHashList._list_load_success = True
         elif not load_error and i == 0: DatHashList._list_load_success = True
         else: DatHashList._list_load_success = False
+        DatHashList.m_HashList = m_HashList
         DatHashList._list_loaded = True
         DatHashList.update_load_progress(total_count, total_count)
         DatHashList.set_loading_status(False)
@@ -232,80 +340,1171 @@ class DatHashList:
         if not DatHashList._list_loaded or not DatHashList._list_load_success: return None
         return DatHashList.m_HashList.get(dwHash)
 
+class DatNameIndex:
+    def __init__(self, m_Names: Optional[Dict[int, str]] = None):
+        self.m_Names: Dict[int, str] = m_Names if m_Names is not None else {}
+
+    def __len__(self) -> int: return len(self.m_Names)
+
+    def get(self, dwHash: int) -> Optional[str]: return self.m_Names.get(dwHash)
+
+    @staticmethod
+    def iFromHashList() -> 'DatNameIndex':
+        if not DatHashList._list_loaded or not DatHashList._list_load_success: return DatNameIndex()
+        return DatNameIndex(DatHashList.m_HashList)
+
 class DatHelpers:
     @staticmethod
-    def ReadWriteFile(m_ArchiveFile: str, m_FullPath: str, dwOffset: int, dwSize: int):
-        MAX_BUFFER = 524288; dwBytesLeft = dwSize
+    def iAdvise(fd: int, dwOffset: int, dwLength: int, m_Advice: str):
+        advice = getattr(os, m_Advice, None)
+        if advice is None or not hasattr(os, 'posix_fadvise'): return
+        try: os.posix_fadvise(fd, dwOffset, dwLength, advice)
+        except OSError: pass
+    @staticmethod
+    def iAdviseMap(m_Map: mmap.mmap, m_Advice: str, dwOffset: int = 0, dwLength: int = 0):
+        advice = getattr(mmap, m_Advice, None)
+        if advice is None or not hasattr(m_Map, 'madvise'): return
+        start = dwOffset - dwOffset % mmap.PAGESIZE
+        length = (dwOffset + dwLength - start) if dwLength > 0 else len(m_Map) - start
+        try: m_Map.madvise(advice, start, min(length, len(m_Map) - start))
+        except (OSError, ValueError): pass
+    @staticmethod
+    def iPreallocate(fd: int, dwSize: int):
+        if dwSize <= 0 or not hasattr(os, 'posix_fallocate'): return
+        try: os.posix_fallocate(fd, 0, dwSize)
+        except OSError: pass
+    @staticmethod
+    def iDigestRange(TStream: io.BufferedIOBase, dwOffset: int, dwSize: int) -> str:
+        MAX_BUFFER = 524288; dwBytesLeft = dwSize; m_Hasher = hashlib.blake2b(digest_size=16)
+        TStream.seek(dwOffset)
+        while dwBytesLeft > 0:
+            read_size = min(dwBytesLeft, MAX_BUFFER); m_Hasher.update(Helpers.read_bytes(TStream, read_size)); dwBytesLeft -= read_size
+        return m_Hasher.hexdigest()
+    @staticmethod
+    def iUnlinkShared(m_FullPath: str):
+        try:
+            if os.stat(m_FullPath).st_nlink > 1: os.remove(m_FullPath)
+        except OSError: pass
+    @staticmethod
+    def iTouchPages(m_View: memoryview) -> int:
+        # One byte per page is enough to fault the whole range in without copying it.
+        if not len(m_View): return 0
+        return sum(m_View[::mmap.PAGESIZE]) + m_View[-1]
+
+    @staticmethod
+    def iDigestBytes(m_Data) -> str: return hashlib.blake2b(m_Data, digest_size=16).hexdigest()
+    @staticmethod
+    def WriteView(m_View: memoryview, m_FullPath: str, bPreallocate: bool = True, bDropCache: bool = False):
+        with open(m_FullPath, 'wb') as TDstStream:
+            if len(m_View) <= 0: return
+            if bPreallocate: DatHelpers.iPreallocate(TDstStream.fileno(), len(m_View))
+            TDstStream.write(m_View)
+            if bDropCache:
+                # Dirty pages cannot be dropped, so write them back first.
+                TDstStream.flush()
+                if hasattr(os, 'fdatasync'): os.fdatasync(TDstStream.fileno())
+                DatHelpers.iAdvise(TDstStream.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+    @staticmethod
+    def ReadWriteFile(m_ArchiveFile: str, m_FullPath: str, dwOffset: int, dwSize: int, bCreateDirectory: bool = True):
         if not os.path.exists(m_ArchiveFile): return
         try:
-            Utils.iCreateDirectory(m_FullPath)
-            with open(m_FullPath, 'wb') as TDstStream, open(m_ArchiveFile, 'rb') as TArchiveStream:
-                TArchiveStream.seek(dwOffset)
-                if dwSize <= 0: return
-                while dwBytesLeft > 0:
-                    read_size = min(dwBytesLeft, MAX_BUFFER); lpBuffer = Helpers.read_bytes(TArchiveStream, read_size); TDstStream.write(lpBuffer); dwBytesLeft -= read_size
+            if bCreateDirectory: Utils.iCreateDirectory(m_FullPath)
+            with open(m_ArchiveFile, 'rb') as TArchiveStream, mmap.mmap(TArchiveStream.fileno(), 0, access=mmap.ACCESS_READ) as m_Map:
+                with memoryview(m_Map)[dwOffset:dwOffset + dwSize] as m_View: DatHelpers.WriteView(m_View, m_FullPath)
         except Exception as e: pass
 
+class DatManifest:
+    SAVE_INTERVAL = 2.0
+
+    def __init__(self, m_ManifestPath: str, m_Archive: str):
+        self.m_ManifestPath = m_ManifestPath
+        self.m_Archive = m_Archive
+        self.m_Records: Dict[str, dict] = {}
+        self.m_Lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+    @staticmethod
+    def iGetManifestPath(m_Archive: str, m_DstFolder: str) -> str:
+        return os.path.join(m_DstFolder, f".{os.path.basename(m_Archive)}.cedat-manifest.json")
+
+    @staticmethod
+    def iLoad(m_Archive: str, m_DstFolder: str) -> 'DatManifest':
+        m_Manifest = DatManifest(DatManifest.iGetManifestPath(m_Archive, m_DstFolder), m_Archive)
+        try:
+            with open(m_Manifest.m_ManifestPath, 'r', encoding='utf-8') as f: data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("entries"), dict): m_Manifest.m_Records = data["entries"]
+        except (FileNotFoundError, ValueError, OSError): pass
+        return m_Manifest
+
+    def is_current(self, relative_path: str, entry: DatEntry, m_FullPath: str, verify_digest: bool = False, m_Data: Optional[memoryview] = None) -> bool:
+        record = self.m_Records.get(relative_path)
+        if not record or not record.get("done"): return False
+        if (record.get("hash"), record.get("offset"), record.get("size")) != (entry.dwHash, entry.dwOffset, entry.dwSize): return False
+        if record.get("duplicate_of"):
+            m_FullPath = os.path.join(os.path.dirname(self.m_ManifestPath), record["duplicate_of"])
+        try:
+            if os.stat(m_FullPath).st_size != entry.dwSize: return False
+        except (OSError, ValueError): return False
+        if verify_digest:
+            try:
+                with open(m_FullPath, 'rb') as f:
+                    if DatHelpers.iDigestRange(f, 0, entry.dwSize) != record.get("digest"): return False
+                if m_Data is not None and DatHelpers.iDigestBytes(m_Data) != record.get("digest"): return False
+            except (OSError, EOFError): return False
+        return True
+
+    def mark(self, relative_path: str, entry: DatEntry, digest: Optional[str], done: bool, duplicate_of: Optional[str] = None):
+        with self.m_Lock:
+            self.m_Records[relative_path] = {"hash": entry.dwHash, "offset": entry.dwOffset, "size": entry.dwSize, "digest": digest, "done": done}
+            if duplicate_of is not None: self.m_Records[relative_path]["duplicate_of"] = duplicate_of
+        if time.monotonic() - self._last_save >= DatManifest.SAVE_INTERVAL: self.save()
+
+    def save(self):
+        with self.m_Lock:
+            self._last_save = time.monotonic()
+            data = {"archive": os.path.abspath(self.m_Archive), "entries": self.m_Records}
+            tmp_path = self.m_ManifestPath + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, separators=(',', ':'))
+                os.replace(tmp_path, self.m_ManifestPath)
+            except OSError: pass
+
+class DatProgress:
+    # Throughput is measured over the last RATE_WINDOW seconds, so it tracks the current speed rather than the run average.
+    RATE_WINDOW = 5.0
+    SAMPLE_INTERVAL = 0.2
+
+    def __init__(self):
+        self.m_Lock = threading.Lock()
+        self.entries_total = 0
+        self.entries_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.errors = 0
+        self.started: Optional[float] = None
+        self.stopped: Optional[float] = None
+        self.m_Samples: deque = deque()
+
+    def set_totals(self, entries_total: int, bytes_total: int):
+        with self.m_Lock:
+            self.entries_total = entries_total; self.bytes_total = bytes_total
+            self.started = time.monotonic(); self.stopped = None
+            self.m_Samples = deque([(self.started, self.entries_done, self.bytes_done)])
+
+    def add(self, entries: int = 0, bytes_count: int = 0, errors: int = 0):
+        with self.m_Lock:
+            self.entries_done += entries; self.bytes_done += bytes_count; self.errors += errors
+            now = time.monotonic()
+            if not self.m_Samples or now - self.m_Samples[-1][0] >= DatProgress.SAMPLE_INTERVAL:
+                self.m_Samples.append((now, self.entries_done, self.bytes_done))
+                while len(self.m_Samples) > 2 and now - self.m_Samples[0][0] > DatProgress.RATE_WINDOW: self.m_Samples.popleft()
+
+    def stop(self):
+        with self.m_Lock:
+            if self.started is not None and self.stopped is None: self.stopped = time.monotonic()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self.m_Lock:
+            now = self.stopped if self.stopped is not None else time.monotonic()
+            elapsed = now - self.started if self.started is not None else 0.0
+            if self.stopped is not None or not self.m_Samples: since, entries_since, bytes_since = self.started or now, 0, 0
+            else: since, entries_since, bytes_since = self.m_Samples[0]
+            span = now - since
+            bytes_per_sec = (self.bytes_done - bytes_since) / span if span > 0 else 0.0
+            entries_per_sec = (self.entries_done - entries_since) / span if span > 0 else 0.0
+            bytes_left = max(0, self.bytes_total - self.bytes_done)
+            if self.stopped is not None or bytes_left == 0: eta = 0.0
+            else: eta = bytes_left / bytes_per_sec if bytes_per_sec > 0 else None
+            return {"entries_done": self.entries_done, "entries_total": self.entries_total, "bytes_done": self.bytes_done, "bytes_total": self.bytes_total, "errors": self.errors,
+                    "elapsed": round(elapsed, 3), "bytes_per_sec": round(bytes_per_sec, 1), "entries_per_sec": round(entries_per_sec, 1), "eta": round(eta, 1) if eta is not None else None}
+
+    @staticmethod
+    def iFraction(m_Snapshot: Dict[str, object]) -> float:
+        if not m_Snapshot["entries_total"]: return 0.0
+        return min(1.0, (m_Snapshot["entries_done"] + m_Snapshot["errors"]) / m_Snapshot["entries_total"])
+
+    @staticmethod
+    def iFormat(m_Snapshot: Dict[str, object]) -> str:
+        eta = m_Snapshot["eta"]
+        eta_text = "--:--" if eta is None else f"{int(eta) // 60}:{int(eta) % 60:02d}"
+        return (f"{m_Snapshot['entries_done']}/{m_Snapshot['entries_total']} files, {m_Snapshot['bytes_done'] / 1048576:.1f}/{m_Snapshot['bytes_total'] / 1048576:.1f} MiB, "
+                f"{m_Snapshot['bytes_per_sec'] / 1048576:.1f} MiB/s, {m_Snapshot['entries_per_sec']:.0f} files/s, ETA {eta_text}")
+
+class DatBytesQueue:
+    # Bounded by the bytes it holds rather than the item count; one oversized item still fits into an empty queue.
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(1, max_bytes)
+        self.m_Cond = threading.Condition()
+        self.m_Items: deque = deque()
+        self.queued_bytes = 0
+        self.peak_bytes = 0
+        self.entries_in = 0
+        self.entries_out = 0
+        self.put_waits = 0
+        self.get_waits = 0
+        self.closed = False
+
+    def put(self, item, size: int) -> bool:
+        with self.m_Cond:
+            if self.m_Items and self.queued_bytes + size > self.max_bytes and not self.closed:
+                self.put_waits += 1
+                while self.m_Items and self.queued_bytes + size > self.max_bytes and not self.closed: self.m_Cond.wait()
+            if self.closed: return False
+            self.m_Items.append((item, size)); self.queued_bytes += size; self.entries_in += 1
+            self.peak_bytes = max(self.peak_bytes, self.queued_bytes)
+            self.m_Cond.notify_all()
+            return True
+
+    def get(self):
+        with self.m_Cond:
+            if not self.m_Items and not self.closed:
+                self.get_waits += 1
+                while not self.m_Items and not self.closed: self.m_Cond.wait()
+            if not self.m_Items: return None
+            item, size = self.m_Items.popleft(); self.queued_bytes -= size; self.entries_out += 1
+            self.m_Cond.notify_all()
+            return item
+
+    def close(self):
+        with self.m_Cond: self.closed = True; self.m_Cond.notify_all()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.m_Cond:
+            return {"read": self.entries_in, "written": self.entries_out, "queued_entries": len(self.m_Items), "queued_bytes": self.queued_bytes,
+                    "peak_bytes": self.peak_bytes, "reader_waits": self.put_waits, "writer_waits": self.get_waits}
+
+class DatTimings:
+    PHASES = ("index", "detect", "plan", "read", "write")
+
+    def __init__(self):
+        self.m_Lock = threading.Lock()
+        self.m_Seconds: Dict[str, float] = dict.fromkeys(DatTimings.PHASES, 0.0)
+
+    def add(self, phase: str, seconds: float):
+        with self.m_Lock: self.m_Seconds[phase] += seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.m_Lock: return dict(self.m_Seconds)
+
+    def iFormat(self) -> str:
+        return ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in self.snapshot().items())
+
+class DatSink:
+    # begin/end bracket each session writing into the sink; close() is left to whoever created it, so one sink can take several archives.
+    # Sinks that are not thread_safe provide m_WriteLock, shared by every session writing into them.
+    thread_safe = True
+
+    def begin(self, m_Session: 'UnpackSession', output_queue: queue.Queue): pass
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview): raise NotImplementedError
+    def end(self, m_Session: 'UnpackSession', output_queue: queue.Queue): pass
+    def close(self): pass
+
+    @staticmethod
+    def iGetMemberName(m_Session: 'UnpackSession', relative_path: str, labelled: bool = True) -> str:
+        name = relative_path.replace(os.path.sep, '/')
+        if '\0' in name: raise ValueError("embedded null byte")
+        return f"{m_Session.label}/{name}" if labelled and m_Session.label else name
+
+class DatNullSink(DatSink):
+    def __init__(self):
+        self.m_Lock = threading.Lock()
+        self.entries = 0
+        self.bytes_count = 0
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        DatHelpers.iTouchPages(m_View)
+        with self.m_Lock: self.entries += 1; self.bytes_count += len(m_View)
+
+class DatMemorySink(DatSink):
+    def __init__(self):
+        self.m_Lock = threading.Lock()
+        self.m_Files: Dict[str, bytes] = {}
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        data = m_View.tobytes()
+        with self.m_Lock: self.m_Files[DatSink.iGetMemberName(m_Session, relative_path)] = data
+
+class DatDirectorySink(DatSink):
+    # Plain files under one folder, without the manifest, resume or dedup handling of the default directory output.
+    def __init__(self, m_DstFolder: str, preallocate: bool = True, drop_cache: bool = False):
+        self.m_DstFolder = Utils.iCheckArgumentsPath(m_DstFolder)
+        self.preallocate = preallocate
+        self.drop_cache = drop_cache
+
+    def iGetPath(self, m_Session: 'UnpackSession', relative_path: str) -> str:
+        return os.path.join(self.m_DstFolder, m_Session.label or "", relative_path)
+
+    def begin(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        os.makedirs(self.m_DstFolder, exist_ok=True)
+        Utils.iCreateDirectoryPlan(self.m_DstFolder, [self.iGetPath(m_Session, relative_path_os) for _, relative_path_os, _ in m_Session.m_Pending])
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        DatHelpers.WriteView(m_View, self.iGetPath(m_Session, relative_path), self.preallocate, self.drop_cache)
+
+class DatViewReader:
+    def __init__(self, m_View: memoryview): self.m_View = m_View; self.position = 0
+    def read(self, count: int = -1) -> memoryview:
+        end = len(self.m_View) if count is None or count < 0 else min(len(self.m_View), self.position + count)
+        chunk = self.m_View[self.position:end]; self.position = end
+        return chunk
+
+class DatTarSink(DatSink):
+    thread_safe = False
+
+    def __init__(self, m_TarPath: str, compression: str = ""):
+        self.m_TarPath = m_TarPath
+        self.m_WriteLock = threading.Lock()
+        self.compression = compression
+        self.m_Tar: Optional[tarfile.TarFile] = None
+        self.m_Times: Dict[str, int] = {}
+
+    @staticmethod
+    def iGetCompression(m_TarPath: str) -> str:
+        lower = m_TarPath.lower()
+        for suffixes, compression in ((('.tar.gz', '.tgz'), 'gz'), (('.tar.bz2', '.tbz2'), 'bz2'), (('.tar.xz', '.txz'), 'xz')):
+            if lower.endswith(suffixes): return compression
+        return ""
+
+    def begin(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        try: mtime = int(os.path.getmtime(m_Session.m_Archive))
+        except OSError: mtime = int(time.time())
+        with self.m_WriteLock:
+            if self.m_Tar is None:
+                m_Dir = os.path.dirname(os.path.abspath(self.m_TarPath)); os.makedirs(m_Dir, exist_ok=True)
+                self.m_Tar = tarfile.open(self.m_TarPath, f"w:{self.compression}" if self.compression else "w", format=tarfile.PAX_FORMAT)
+            self.m_Times[m_Session.m_Archive] = mtime
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        m_Info = tarfile.TarInfo(DatSink.iGetMemberName(m_Session, relative_path))
+        m_Info.size = len(m_View); m_Info.mtime = self.m_Times[m_Session.m_Archive]; m_Info.mode = 0o644
+        self.m_Tar.addfile(m_Info, DatViewReader(m_View))
+
+    def close(self):
+        if self.m_Tar is not None: self.m_Tar.close(); self.m_Tar = None
+
+class DatZipSink(DatSink):
+    thread_safe = False
+
+    def __init__(self, m_ZipPath: str, compression: int = zipfile.ZIP_DEFLATED):
+        self.m_ZipPath = m_ZipPath
+        self.m_WriteLock = threading.Lock()
+        self.compression = compression
+        self.m_Zip: Optional[zipfile.ZipFile] = None
+        self.m_Times: Dict[str, Tuple[int, ...]] = {}
+
+    def begin(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        try: mtime = max(time.localtime(os.path.getmtime(m_Session.m_Archive))[:6], (1980, 1, 1, 0, 0, 0))
+        except OSError: mtime = time.localtime()[:6]
+        with self.m_WriteLock:
+            if self.m_Zip is None:
+                m_Dir = os.path.dirname(os.path.abspath(self.m_ZipPath)); os.makedirs(m_Dir, exist_ok=True)
+                self.m_Zip = zipfile.ZipFile(self.m_ZipPath, "w", compression=self.compression, allowZip64=True)
+            self.m_Times[m_Session.m_Archive] = mtime
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        m_Info = zipfile.ZipInfo(DatSink.iGetMemberName(m_Session, relative_path), date_time=self.m_Times[m_Session.m_Archive])
+        m_Info.compress_type = self.compression; m_Info.file_size = len(m_View); m_Info.external_attr = 0o644 << 16
+        with self.m_Zip.open(m_Info, "w", force_zip64=len(m_View) >= zipfile.ZIP64_LIMIT) as TDstStream: TDstStream.write(m_View)
+
+    def close(self):
+        if self.m_Zip is not None: self.m_Zip.close(); self.m_Zip = None
+
+class DatBlobStoreSink(DatSink):
+    def __init__(self, m_StoreFolder: str):
+        self.m_StoreFolder = m_StoreFolder
+        self.m_ObjectsFolder = os.path.join(m_StoreFolder, "objects")
+        self.m_ManifestsFolder = os.path.join(m_StoreFolder, "manifests")
+        self.m_Lock = threading.Lock()
+        self.m_KnownDirs: set = set()
+        self.m_Names: Dict[str, str] = {}
+        self.m_Records: Dict[str, Dict[str, dict]] = {}
+        self.m_Previous: Dict[str, Dict[str, dict]] = {}
+        self.m_Stats: Dict[str, List[int]] = {}
+
+    def iGetBlobPath(self, digest: str) -> str: return os.path.join(self.m_ObjectsFolder, digest[:2], digest[2:4], digest)
+
+    def manifest_name(self, m_Session: 'UnpackSession') -> str:
+        with self.m_Lock:
+            m_Key = os.path.abspath(m_Session.m_Archive)
+            if m_Key not in self.m_Names:
+                # A short digest of the full path keeps the name stable across runs and apart from same-named archives elsewhere.
+                name = base = f"{os.path.basename(m_Key)}-{hashlib.blake2b(os.path.normcase(m_Key).encode('utf-8'), digest_size=4).hexdigest()}"; n = 1
+                while name in self.m_Names.values() or self.iGetManifestArchive(name) not in (None, m_Key): n += 1; name = f"{base}_{n}"
+                self.m_Names[m_Key] = name
+            return self.m_Names[m_Key]
+
+    def iGetManifestArchive(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.m_ManifestsFolder, name + ".json"), 'r', encoding='utf-8') as f: return json.load(f).get("archive")
+        except (OSError, ValueError, AttributeError): return None
+
+    def begin(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        os.makedirs(self.m_ManifestsFolder, exist_ok=True)
+        name = self.manifest_name(m_Session); previous = {}
+        try:
+            with open(os.path.join(self.m_ManifestsFolder, name + ".json"), 'r', encoding='utf-8') as f: previous = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError): pass
+        with self.m_Lock: self.m_Records[name] = {}; self.m_Previous[name] = previous; self.m_Stats[name] = [0, 0, 0]
+
+    def lookup(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str) -> Optional[dict]:
+        # An unchanged entry whose blob is already stored is recorded without reading it again.
+        name = self.manifest_name(m_Session)
+        record = self.m_Previous.get(name, {}).get(relative_path.replace(os.path.sep, '/'))
+        if not record or (record.get("hash"), record.get("offset"), record.get("size")) != (m_Entry.dwHash, m_Entry.dwOffset, m_Entry.dwSize): return None
+        if not os.path.exists(self.iGetBlobPath(record.get("digest", ""))): return None
+        with self.m_Lock: self.m_Records[name][relative_path.replace(os.path.sep, '/')] = record; self.m_Stats[name][2] += 1
+        return record
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        digest = DatHelpers.iDigestBytes(m_View); m_BlobPath = self.iGetBlobPath(digest); name = self.manifest_name(m_Session)
+        if os.path.exists(m_BlobPath):
+            with self.m_Lock: self.m_Stats[name][2] += 1
+        else:
+            m_Dir = os.path.dirname(m_BlobPath)
+            if m_Dir not in self.m_KnownDirs: os.makedirs(m_Dir, exist_ok=True); self.m_KnownDirs.add(m_Dir)
+            tmp_path = f"{m_BlobPath}.{os.getpid()}.{threading.get_ident()}.tmp"
+            DatHelpers.WriteView(m_View, tmp_path, m_Session.preallocate, m_Session.drop_cache)
+            os.replace(tmp_path, m_BlobPath)
+            with self.m_Lock: self.m_Stats[name][0] += 1; self.m_Stats[name][1] += len(m_View)
+        record = {"digest": digest, "hash": m_Entry.dwHash, "offset": m_Entry.dwOffset, "size": m_Entry.dwSize, "ext": os.path.splitext(relative_path)[1]}
+        with self.m_Lock: self.m_Records[name][relative_path.replace(os.path.sep, '/')] = record
+
+    def end(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        name = self.manifest_name(m_Session)
+        with self.m_Lock: data = {"archive": os.path.abspath(m_Session.m_Archive), "entries": self.m_Records.get(name, {})}; blobs_written, bytes_written, blobs_reused = self.m_Stats.get(name, [0, 0, 0])
+        m_ManifestPath = os.path.join(self.m_ManifestsFolder, name + ".json"); tmp_path = m_ManifestPath + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, m_ManifestPath)
+        output_queue.put(f"INFO: Blob store ({name}): {blobs_written} new blobs ({bytes_written} bytes), {blobs_reused} already stored.")
+
+class DatSqliteSink(DatSink):
+    thread_safe = False
+    COMMIT_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, m_DbPath: str):
+        self.m_DbPath = m_DbPath
+        self.m_WriteLock = threading.Lock()
+        self.m_Db = None
+        self.pending_bytes = 0
+        self.m_Stats: Dict[str, List[int]] = {}
+
+    def begin(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        with self.m_WriteLock:
+            if self.m_Db is None:
+                import sqlite3
+                m_Dir = os.path.dirname(os.path.abspath(self.m_DbPath)); os.makedirs(m_Dir, exist_ok=True)
+                self.m_Db = sqlite3.connect(self.m_DbPath, isolation_level=None, check_same_thread=False)
+                self.m_Db.execute("PRAGMA journal_mode=WAL"); self.m_Db.execute("PRAGMA synchronous=NORMAL")
+                self.m_Db.execute("CREATE TABLE IF NOT EXISTS entries (archive TEXT NOT NULL, hash INTEGER NOT NULL, resolved_name TEXT NOT NULL, ext TEXT NOT NULL, "
+                                  "offset INTEGER NOT NULL, size INTEGER NOT NULL, blob BLOB NOT NULL, UNIQUE (archive, resolved_name))")
+                self.m_Db.execute("BEGIN")
+            self.m_Stats[DatSqliteSink.iGetArchiveKey(m_Session)] = [0, 0]
+
+    @staticmethod
+    def iGetArchiveKey(m_Session: 'UnpackSession') -> str:
+        # Batch labels are unique per run (a, a_2, ...); two archives sharing a file name would otherwise replace each other's rows.
+        # A single extract uses the same file stem, so its rows line up with a batch run over the same archive.
+        return m_Session.label or os.path.splitext(os.path.basename(m_Session.m_Archive))[0]
+
+    def write(self, m_Session: 'UnpackSession', m_Entry: DatEntry, relative_path: str, m_View: memoryview):
+        name = DatSink.iGetMemberName(m_Session, relative_path, labelled=False); archive = DatSqliteSink.iGetArchiveKey(m_Session)
+        ext = os.path.splitext(name)[1][1:].lower()
+        self.m_Db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", (archive, m_Entry.dwHash, name, ext, m_Entry.dwOffset, m_Entry.dwSize, m_View))
+        m_Stat = self.m_Stats[archive]; m_Stat[0] += 1; m_Stat[1] += len(m_View)
+        self.pending_bytes += len(m_View)
+        if self.pending_bytes >= DatSqliteSink.COMMIT_BYTES: self.m_Db.execute("COMMIT"); self.m_Db.execute("BEGIN"); self.pending_bytes = 0
+
+    def end(self, m_Session: 'UnpackSession', output_queue: queue.Queue):
+        archive = DatSqliteSink.iGetArchiveKey(m_Session)
+        with self.m_WriteLock:
+            self.m_Db.execute("COMMIT"); self.m_Db.execute("BEGIN"); self.pending_bytes = 0
+            rows, bytes_written = self.m_Stats.get(archive, [0, 0])
+        output_queue.put(f"INFO: SQLite ({archive}): {rows} rows ({bytes_written} bytes) in {self.m_DbPath}.")
+
+    def close(self):
+        if self.m_Db is None: return
+        self.m_Db.execute("COMMIT")
+        self.m_Db.execute("CREATE INDEX IF NOT EXISTS entries_name ON entries (resolved_name)")
+        self.m_Db.execute("CREATE INDEX IF NOT EXISTS entries_ext ON entries (ext)")
+        self.m_Db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.m_Db.close(); self.m_Db = None
+
+class UnpackSession:
+    LOG_BATCH = 256
+    LOG_INTERVAL = 0.05
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, m_Archive: str, m_DstFolder: Optional[str] = None, name_index: Optional[DatNameIndex] = None, preallocate: bool = True, drop_cache: bool = False,
+                 resume: bool = False, verify_digest: bool = False, entry_filter: Optional[DatFilter] = None, workers: int = 1, dedup: bool = False, sink: Optional[DatSink] = None, benchmark: bool = False, pipeline_bytes: int = 0,
+                 converter=None):
+        self.m_Archive = m_Archive
+        self.m_DstFolder = Utils.iCheckArgumentsPath(m_DstFolder) if m_DstFolder else m_DstFolder
+        self.name_index = name_index if name_index is not None else DatNameIndex.iFromHashList()
+        self.preallocate = preallocate
+        self.drop_cache = drop_cache
+        self.resume = resume
+        self.verify_digest = verify_digest
+        self.entry_filter = entry_filter if entry_filter is not None and not entry_filter.is_empty() else None
+        self.workers = max(1, workers)
+        self.dedup = dedup
+        self.sink = sink
+        self.label: Optional[str] = None
+        self.benchmark = benchmark
+        self.pipeline_bytes = pipeline_bytes
+        self.converter = converter
+        self.m_Pipeline: Optional[DatBytesQueue] = None
+        self.timings = DatTimings()
+        self.progress = DatProgress()
+        self.state = "idle"
+        self.status_message = "Idle."
+        self.TArchiveStream: Optional[io.BufferedIOBase] = None
+        self.m_Map: Optional[mmap.mmap] = None
+        self.m_Table: Optional[DatEntryTable] = None
+        self.m_Manifest: Optional[DatManifest] = None
+        self.m_Pending: List[Tuple[DatEntry, str, str]] = []
+        self.m_Links: Dict[str, List[Tuple[DatEntry, str, str]]] = {}
+        self.m_Thread: Optional[threading.Thread] = None
+        self._cancel_event = threading.Event()
+        self._resume_event = threading.Event(); self._resume_event.set()
+        self.m_LogLock = threading.Lock()
+        self.m_LogLines: List[str] = []
+        self.log_flushed = time.monotonic()
+        self.progress_sent = 0.0
+        self.m_Flusher: Optional[threading.Thread] = None
+        self._flusher_stop = threading.Event()
+
+    def __enter__(self) -> 'UnpackSession': self.open(); return self
+    def __exit__(self, *exc_info): self.close()
+
+    def open(self):
+        if self.m_Table is not None: return
+        self.TArchiveStream = open(self.m_Archive, 'rb')
+        try:
+            start = time.perf_counter()
+            self.m_Table = DatEntryTable.iLoadStream(self.TArchiveStream)
+            self.timings.add("index", time.perf_counter() - start)
+            archive_size = os.fstat(self.TArchiveStream.fileno()).st_size
+            self.m_Map = mmap.mmap(self.TArchiveStream.fileno(), 0, access=mmap.ACCESS_READ) if archive_size > 0 else None
+        except Exception: self.close(); raise
+
+    def close(self):
+        if self.m_Map is not None:
+            try: self.m_Map.close()
+            except BufferError: pass
+            self.m_Map = None
+        if self.TArchiveStream is not None: self.TArchiveStream.close(); self.TArchiveStream = None
+
+    def cancel(self):
+        self._cancel_event.set(); self._resume_event.set()
+        if self.is_running(): self.status_message = "Cancelling..."
+
+    def pause(self):
+        if self.is_cancelled() or not self.is_running(): return
+        self._resume_event.clear(); self.status_message = "Paused."
+
+    def unpause(self):
+        if self.is_paused() and self.is_running(): self.status_message = "Processing..."
+        self._resume_event.set()
+
+    def is_cancelled(self) -> bool: return self._cancel_event.is_set()
+    def is_paused(self) -> bool: return not self._resume_event.is_set()
+
+    def wait_if_paused(self) -> bool:
+        # Called between entries only, so pausing or cancelling never leaves a half-written file behind.
+        self._resume_event.wait()
+        return not self.is_cancelled()
+    def is_running(self) -> bool: return self.state == "running"
+
+    def read_view(self, entry: DatEntry) -> memoryview:
+        if entry.dwSize == 0: return memoryview(b'')
+        if self.m_Map is None or entry.dwOffset + entry.dwSize > len(self.m_Map):
+            raise EOFError(f"Entry {entry.dwHash:08X} runs past the end of the archive.")
+        return memoryview(self.m_Map)[entry.dwOffset : entry.dwOffset + entry.dwSize]
+
+    def detect(self, entry: DatEntry) -> Tuple[str, str]:
+        magic_int = None
+        if entry.dwSize >= 4 and self.m_Map is not None and entry.dwOffset + 4 <= len(self.m_Map): magic_int = struct.unpack_from('<I', self.m_Map, entry.dwOffset)[0]
+        detected_ext = DatUnpack.iGetTypeFromMagic(magic_int)
+        return DatUnpack.iGetRelativePath(entry.dwHash, detected_ext, self.name_index), detected_ext
+
+    def resolve(self, m_Entries: Optional[List[DatEntry]] = None, entry_filter: Optional[DatFilter] = None) -> List[Tuple[DatEntry, str, str]]:
+        self.open()
+        if entry_filter is None: entry_filter = self.entry_filter
+        start = time.perf_counter()
+        if m_Entries is None: m_Entries = DatUnpack.iSelectEntries(self.m_Table, entry_filter)
+        m_Resolved = [(m_Entry,) + self.detect(m_Entry) for m_Entry in m_Entries]
+        if entry_filter is not None and entry_filter.has_name_terms():
+            name_mask = entry_filter.iMaskNames([r[1] for r in m_Resolved], [r[2] for r in m_Resolved], [self.name_index.get(r[0].dwHash) for r in m_Resolved])
+            m_Resolved = [r for r, m in zip(m_Resolved, name_mask) if m]
+        self.timings.add("detect", time.perf_counter() - start)
+        return m_Resolved
+
+    def prepare(self, output_queue: queue.Queue) -> bool:
+        try: self.open()
+        except FileNotFoundError: output_queue.put(f"ERROR: Archive not found: {self.m_Archive}"); return False
+        except Exception as read_err: output_queue.put(f"ERROR: Failed reading index: {read_err}"); return False
+        total_entries = len(self.m_Table)
+        if total_entries == 0: output_queue.put(f"WARNING: No file entries found in the archive: {self.m_Archive}"); return False
+        if self.sink is not None: return self.prepare_sink(output_queue)
+        try:
+            os.makedirs(self.m_DstFolder, exist_ok=True)
+            if not len(self.name_index): os.makedirs(os.path.join(self.m_DstFolder, "__Unknown"), exist_ok=True)
+        except Exception: pass
+        self.m_Manifest = DatManifest.iLoad(self.m_Archive, self.m_DstFolder)
+        skipped_count = 0
+        try:
+            m_Resolved = self.resolve()
+            if self.entry_filter is not None: output_queue.put(f"INFO: Filter selected {len(m_Resolved)} of {total_entries} entries.")
+            start = time.perf_counter()
+            m_Jobs = DatUnpack.iPlanOutputs(self.m_DstFolder, m_Resolved)
+            if self.resume:
+                for m_FullPath, (m_Entry, relative_path_os, _) in list(m_Jobs.items()):
+                    if self.is_cancelled(): output_queue.put("INFO: Cancelled while checking existing files."); return False
+                    m_Data = self.read_view(m_Entry) if self.verify_digest else None
+                    try:
+                        if self.m_Manifest.is_current(relative_path_os, m_Entry, m_FullPath, self.verify_digest, m_Data):
+                            del m_Jobs[m_FullPath]; skipped_count += 1
+                    finally:
+                        if m_Data is not None: m_Data.release()
+        except Exception as name_err: output_queue.put(f"ERROR: Failed resolving names: {name_err}"); return False
+        if skipped_count: output_queue.put(f"INFO: Skipped {skipped_count} unchanged entries.")
+        self.m_Pending = sorted(m_Jobs.values(), key=lambda job: job[0].dwOffset)
+        self.progress.set_totals(len(self.m_Pending), sum(job[0].dwSize for job in self.m_Pending))
+        dirs_planned, makedirs_calls = Utils.iCreateDirectoryPlan(self.m_DstFolder, [m_FullPath for _, _, m_FullPath in self.m_Pending])
+        if self.dedup and not self.plan_dedup(output_queue): output_queue.put("INFO: Cancelled while looking for duplicates."); return False
+        output_queue.put(f"INFO: Directory plan: {dirs_planned} mkdir calls instead of {makedirs_calls} per-file makedirs calls.")
+        self.timings.add("plan", time.perf_counter() - start)
+        if self.m_Map is not None: DatHelpers.iAdviseMap(self.m_Map, 'MADV_SEQUENTIAL')
+        return True
+
+    def prepare_sink(self, output_queue: queue.Queue) -> bool:
+        try:
+            m_Resolved = self.resolve()
+            if self.entry_filter is not None: output_queue.put(f"INFO: Filter selected {len(m_Resolved)} of {len(self.m_Table)} entries.")
+            start = time.perf_counter()
+            self.m_Pending = sorted(DatUnpack.iPlanOutputs("", m_Resolved).values(), key=lambda job: job[0].dwOffset)
+        except Exception as name_err: output_queue.put(f"ERROR: Failed resolving names: {name_err}"); return False
+        self.progress.set_totals(len(self.m_Pending), sum(job[0].dwSize for job in self.m_Pending))
+        try: self.sink.begin(self, output_queue)
+        except Exception as sink_err: output_queue.put(f"ERROR: Failed opening output: {sink_err}"); return False
+        self.timings.add("plan", time.perf_counter() - start)
+        if self.m_Map is not None: DatHelpers.iAdviseMap(self.m_Map, 'MADV_SEQUENTIAL')
+        return True
+
+    def write_to_sink(self, m_Entry: DatEntry, relative_path_os: str, m_View: memoryview):
+        start = time.perf_counter()
+        if self.sink.thread_safe: self.sink.write(self, m_Entry, relative_path_os, m_View)
+        else:
+            with self.sink.m_WriteLock: self.sink.write(self, m_Entry, relative_path_os, m_View)
+        self.timings.add("write", time.perf_counter() - start)
+
+    def fault_in(self, m_View: memoryview):
+        # Benchmark runs pull the pages in first, so "write" only measures the copy out and the destination.
+        if not self.benchmark: return
+        start = time.perf_counter(); DatHelpers.iTouchPages(m_View); self.timings.add("read", time.perf_counter() - start)
+
+    def finish(self, output_queue: queue.Queue):
+        self.stop_flusher()
+        self.flush_log(output_queue)
+        self.progress.stop(); output_queue.put(self.progress_event(final=True))
+        if self.sink is not None: self.sink.end(self, output_queue)
+        elif self.m_Manifest is not None: self.m_Manifest.save()
+        if self.converter is not None: self.converter.wait(self, output_queue, cancel=self.is_cancelled())
+        if self.benchmark: output_queue.put(f"INFO: Timings ({os.path.basename(self.m_Archive)}): {self.timings.iFormat()}.")
+        if self.m_Pipeline is not None:
+            stats = self.m_Pipeline.snapshot()
+            output_queue.put(f"INFO: Pipeline: peak {stats['peak_bytes']} of {self.m_Pipeline.max_bytes} bytes queued, reader waited {stats['reader_waits']} times, writers waited {stats['writer_waits']} times.")
+
+    def plan_dedup(self, output_queue: queue.Queue) -> bool:
+        # Entries sharing (offset, size) are identical by construction; only equal-sized leftovers need hashing.
+        m_ByRange: Dict[Tuple[int, int], List[Tuple[DatEntry, str, str]]] = {}
+        for job in self.m_Pending: m_ByRange.setdefault((job[0].dwOffset, job[0].dwSize), []).append(job)
+        m_SizeCounts = Counter(dwSize for _, dwSize in m_ByRange)
+        m_Hashed = [group for (_, dwSize), group in m_ByRange.items() if dwSize > 0 and m_SizeCounts[dwSize] > 1]
+        def digest_group(group: List[Tuple[DatEntry, str, str]]) -> Optional[str]:
+            if self.is_cancelled(): return None
+            try:
+                with self.read_view(group[0][0]) as m_View: return DatHelpers.iDigestBytes(m_View)
+            except Exception: return None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(self.workers, os.cpu_count() or 1)) as m_Pool: m_Digests = list(m_Pool.map(digest_group, m_Hashed))
+        if self.is_cancelled(): return False
+        m_Clusters: Dict[tuple, List[Tuple[DatEntry, str, str]]] = {}
+        m_Digested = {id(group): digest for group, digest in zip(m_Hashed, m_Digests) if digest is not None}
+        for key, group in m_ByRange.items():
+            digest = m_Digested.get(id(group))
+            m_Clusters.setdefault((key[1], digest) if digest is not None else key, []).extend(group)
+        self.m_Pending = sorted((cluster[0] for cluster in m_Clusters.values()), key=lambda job: job[0].dwOffset)
+        self.m_Links = {cluster[0][2]: cluster[1:] for cluster in m_Clusters.values() if len(cluster) > 1}
+        linked_count = sum(len(links) for links in self.m_Links.values())
+        linked_bytes = sum(job[0].dwSize for links in self.m_Links.values() for job in links)
+        output_queue.put(f"INFO: Dedup: {linked_count} duplicate entries ({linked_bytes} bytes) will be linked to {len(self.m_Links)} unique blobs.")
+        return True
+
+    def link_duplicates(self, m_Source: Tuple[DatEntry, str, str], digest: str, output_queue: queue.Queue):
+        for m_Entry, relative_path_os, m_FullPath in self.m_Links.get(m_Source[2], []):
+            self.log(relative_path_os, output_queue)
+            try:
+                if os.path.lexists(m_FullPath): os.remove(m_FullPath)
+                os.link(m_Source[2], m_FullPath)
+                if self.m_Manifest is not None: self.m_Manifest.mark(relative_path_os, m_Entry, digest, True)
+            except OSError:
+                # No hardlinks here (e.g. FAT or across devices); the manifest records where the data lives instead.
+                if self.m_Manifest is not None: self.m_Manifest.mark(relative_path_os, m_Entry, digest, True, duplicate_of=m_Source[1])
+            self.convert(m_Entry, relative_path_os, m_FullPath, output_queue)
+            self.progress.add(1, m_Entry.dwSize)
+
+    def convert(self, m_Entry: DatEntry, relative_path_os: str, m_FullPath: str, output_queue: queue.Queue):
+        # Conversion runs in the converter's worker processes, straight from the archive; this thread moves on.
+        if self.converter is not None and relative_path_os.lower().endswith(".dds"): self.converter.submit(self, m_Entry, relative_path_os, m_FullPath, output_queue)
+
+    def log(self, line: str, output_queue: queue.Queue):
+        # File names go out as lists of up to LOG_BATCH lines, or whatever piled up in LOG_INTERVAL seconds.
+        with self.m_LogLock:
+            self.m_LogLines.append(line)
+            if len(self.m_LogLines) >= UnpackSession.LOG_BATCH: output_queue.put(self.m_LogLines); self.m_LogLines = []; self.log_flushed = time.monotonic()
+            if self.m_Flusher is None:
+                self._flusher_stop.clear()
+                self.m_Flusher = threading.Thread(target=self.run_flusher, args=(output_queue,), name="log-flusher", daemon=True)
+                self.m_Flusher.start()
+
+    def run_flusher(self, output_queue: queue.Queue):
+        # The interval flush and the periodic progress event run on their own timer, so neither waits for a long entry to finish writing.
+        while not self._flusher_stop.wait(UnpackSession.LOG_INTERVAL):
+            with self.m_LogLock:
+                now = time.monotonic()
+                if self.m_LogLines and now - self.log_flushed >= UnpackSession.LOG_INTERVAL:
+                    output_queue.put(self.m_LogLines); self.m_LogLines = []; self.log_flushed = now
+                if now - self.progress_sent >= UnpackSession.PROGRESS_INTERVAL: output_queue.put(self.progress_event()); self.progress_sent = now
+
+    def stop_flusher(self):
+        with self.m_LogLock: m_Flusher = self.m_Flusher; self.m_Flusher = None
+        if m_Flusher is not None: self._flusher_stop.set(); m_Flusher.join()
+
+    def progress_event(self, final: bool = False) -> Dict[str, object]:
+        # Progress travels on the output queue as a dict; log lines are strings or lists of strings.
+        return dict(self.progress.snapshot(), event="progress", archive=os.path.basename(self.m_Archive), final=final)
+
+    def flush_log(self, output_queue: queue.Queue):
+        with self.m_LogLock:
+            if self.m_LogLines: output_queue.put(self.m_LogLines); self.m_LogLines = []
+            self.log_flushed = time.monotonic()
+
+    def report_error(self, message: str, output_queue: queue.Queue):
+        self.progress.add(errors=1); self.flush_log(output_queue); output_queue.put(message)
+
+    def extract_entry(self, m_Job: Tuple[DatEntry, str, str], output_queue: queue.Queue, m_View: Optional[memoryview] = None) -> bool:
+        m_Entry, relative_path_os, m_FullPath = m_Job
+        try:
+            self.log(relative_path_os, output_queue)
+            digest = None
+            if self.sink is not None and getattr(self.sink, "lookup", None) is not None and self.sink.lookup(self, m_Entry, relative_path_os) is not None: pass
+            elif m_View is None:
+                with self.read_view(m_Entry) as m_EntryView:
+                    self.fault_in(m_EntryView)
+                    digest = self.write_job(m_Job, m_EntryView)
+            else: digest = self.write_job(m_Job, m_View)
+            if self.sink is None:
+                if self.drop_cache and self.m_Map is not None:
+                    DatHelpers.iAdviseMap(self.m_Map, 'MADV_DONTNEED', m_Entry.dwOffset, m_Entry.dwSize)
+                    DatHelpers.iAdvise(self.TArchiveStream.fileno(), m_Entry.dwOffset, m_Entry.dwSize, 'POSIX_FADV_DONTNEED')
+                if self.m_Manifest is not None: self.m_Manifest.mark(relative_path_os, m_Entry, digest, True)
+                self.convert(m_Entry, relative_path_os, m_FullPath, output_queue)
+            self.progress.add(1, m_Entry.dwSize)
+            if self.sink is None and self.m_Links: self.link_duplicates(m_Job, digest, output_queue)
+            return True
+        except Exception as extract_err:
+            self.report_error(f"ERROR extracting {relative_path_os}: {extract_err}", output_queue)
+            # The duplicates were to be linked to this file, so they fail with it.
+            for _, duplicate_path_os, _ in (self.m_Links.get(m_FullPath, []) if self.sink is None else []):
+                self.report_error(f"ERROR extracting {duplicate_path_os}: duplicate of {relative_path_os}, which failed: {extract_err}", output_queue)
+            return False
+
+    def write_job(self, m_Job: Tuple[DatEntry, str, str], m_View: memoryview) -> Optional[str]:
+        m_Entry, relative_path_os, m_FullPath = m_Job
+        if self.sink is not None: self.write_to_sink(m_Entry, relative_path_os, m_View); return None
+        if self.m_Manifest is not None:
+            # A previous dedup run may have left this path hardlinked; writing through it would clobber the other names.
+            if relative_path_os in self.m_Manifest.m_Records: DatHelpers.iUnlinkShared(m_FullPath)
+            self.m_Manifest.mark(relative_path_os, m_Entry, None, False)
+        start = time.perf_counter()
+        DatHelpers.WriteView(m_View, m_FullPath, self.preallocate, self.drop_cache)
+        digest = DatHelpers.iDigestBytes(m_View)
+        self.timings.add("write", time.perf_counter() - start)
+        return digest
+
+    def extract(self, m_Jobs: List[Tuple[DatEntry, str, str]], output_queue: queue.Queue) -> int:
+        processed_count = 0
+        for index, m_Job in enumerate(m_Jobs):
+            if not self.wait_if_paused(): break
+            if index + 1 < len(m_Jobs) and self.m_Map is not None: DatHelpers.iAdviseMap(self.m_Map, 'MADV_WILLNEED', m_Jobs[index + 1][0].dwOffset, m_Jobs[index + 1][0].dwSize)
+            processed_count += self.extract_entry(m_Job, output_queue)
+        return processed_count
+
+    def extract_pipelined(self, m_Jobs: List[Tuple[DatEntry, str, str]], output_queue: queue.Queue, writers: int) -> int:
+        # The reader faults entries in ahead of the writers, never more than pipeline_bytes ahead of them.
+        self.m_Pipeline = m_Pipeline = DatBytesQueue(self.pipeline_bytes)
+        def read_stage():
+            try:
+                for m_Job in m_Jobs:
+                    if not self.wait_if_paused(): break
+                    try:
+                        m_View = self.read_view(m_Job[0])
+                        start = time.perf_counter(); DatHelpers.iTouchPages(m_View); self.timings.add("read", time.perf_counter() - start)
+                    except Exception as read_err: m_View = read_err
+                    if not m_Pipeline.put((m_Job, m_View), m_Job[0].dwSize):
+                        if isinstance(m_View, memoryview): m_View.release()
+                        break
+            finally: m_Pipeline.close()
+        def write_stage() -> int:
+            processed_count = 0
+            while True:
+                item = m_Pipeline.get()
+                if item is None: return processed_count
+                m_Job, m_View = item
+                if isinstance(m_View, Exception):
+                    self.report_error(f"ERROR extracting {m_Job[1]}: {m_View}", output_queue); continue
+                with m_View:
+                    if self.wait_if_paused(): processed_count += self.extract_entry(m_Job, output_queue, m_View)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=writers + 1) as m_Pool:
+            m_Reader = m_Pool.submit(read_stage)
+            m_Writers = [m_Pool.submit(write_stage) for _ in range(writers)]
+            m_Reader.result()
+            return sum(m_Writer.result() for m_Writer in m_Writers)
+
+    def run(self, output_queue: queue.Queue) -> bool:
+        self.state = "running"; self.status_message = "Processing..."
+        try:
+            if not self.prepare(output_queue):
+                if self.is_cancelled(): self.state = "cancelled"; self.status_message = "Unpacking cancelled."
+                else: self.state = "failed"; self.status_message = "Unpacking failed."
+                return False
+            try:
+                if self.pipeline_bytes > 0: self.extract_pipelined(self.m_Pending, output_queue, self.workers)
+                elif self.workers <= 1: self.extract(self.m_Pending, output_queue)
+                else:
+                    # Each worker takes a contiguous, byte-balanced run of the offset-sorted jobs so its reads stay sequential.
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as m_Pool:
+                        for m_Future in [m_Pool.submit(self.extract, m_Chunk, output_queue) for m_Chunk in DatUnpack.iSplitByBytes(self.m_Pending, self.workers)]: m_Future.result()
+            finally: self.finish(output_queue)
+            if self.is_cancelled():
+                stats = self.progress.snapshot()
+                output_queue.put(f"INFO: Cancelled after {stats['entries_done']} of {stats['entries_total']} entries." + (" Run again with resume to finish." if self.m_Manifest is not None else ""))
+                self.state = "cancelled"; self.status_message = "Unpacking cancelled."
+            else: self.state = "finished"; self.status_message = "Unpacking process finished."
+            return not self.is_cancelled()
+        except Exception as e:
+            output_queue.put(f"FATAL ERROR during unpack: {e}")
+            self.state = "failed"; self.status_message = f"Error during unpacking: {type(e).__name__}"
+            return False
+
+    def start(self, output_queue: queue.Queue) -> threading.Thread:
+        self.state = "running"; self.status_message = "Starting unpacking..."
+        def run_and_close():
+            try: self.run(output_queue)
+            finally: self.close()
+        self.m_Thread = threading.Thread(target=run_and_close, daemon=True)
+        self.m_Thread.start()
+        return self.m_Thread
+
+    def verify(self, m_DstFolder: Optional[str] = None) -> List[Tuple[str, str]]:
+        m_Results: List[Tuple[str, str]] = []
+        for m_Entry, relative_path_os, m_FullPath in DatUnpack.iPlanOutputs(m_DstFolder or self.m_DstFolder, self.resolve()).values():
+            try:
+                if os.stat(m_FullPath).st_size != m_Entry.dwSize: m_Results.append((relative_path_os, "size mismatch")); continue
+                with open(m_FullPath, 'rb') as f: file_digest = DatHelpers.iDigestRange(f, 0, m_Entry.dwSize)
+                with self.read_view(m_Entry) as m_View: status = "ok" if file_digest == DatHelpers.iDigestBytes(m_View) else "content mismatch"
+            except FileNotFoundError: status = "missing"
+            except (OSError, EOFError, ValueError) as verify_err: status = f"error: {verify_err}"
+            m_Results.append((relative_path_os, status))
+        return m_Results
+
 class DatUnpack:
-    m_EntryTable: List[DatEntry] = []
+    @staticmethod
+    def iGetTypeFromMagic(magic_int: Optional[int]) -> str:
+        if magic_int == 0x474E5089: return ".png"
+        elif magic_int == 0x20534444: return ".dds"
+        elif magic_int == 0x4A4D4F45: return ".obj"
+        elif magic_int == 0x00000002: return ".fmt_02"
+        return ".bin"
+
+    @staticmethod
+    def iGetRelativePath(dwHash: int, detected_ext: str, name_index: Optional[DatNameIndex] = None) -> str:
+        base_name_known = name_index.get(dwHash) if name_index is not None else DatHashList.iGetNameFromHashList(dwHash)
+        if base_name_known: name_part = os.path.splitext(base_name_known)[0]; relative_path = name_part + detected_ext
+        else: relative_path = os.path.join("__Unknown", f"{dwHash:08X}{detected_ext}")
+        return relative_path.replace('/', os.path.sep).replace('\\', os.path.sep)
 
     @staticmethod
     def detect_file_type_and_name(archive_path: str, entry: DatEntry) -> Tuple[str, str]:
-        base_name_known = DatHashList.iGetNameFromHashList(entry.dwHash)
-        detected_ext = ".bin"; magic_int = None
+        magic_int = None
         if entry.dwSize >= 4:
             try:
                 with open(archive_path, 'rb') as f: f.seek(entry.dwOffset); header_bytes = Helpers.read_bytes(f, 4)
                 magic_int = struct.unpack('<I', header_bytes)[0]
             except (IOError, EOFError, struct.error, OSError): pass
             except Exception: pass
-        if magic_int is not None:
-            if magic_int == 0x474E5089: detected_ext = ".png"
-            elif magic_int == 0x20534444: detected_ext = ".dds"
-            elif magic_int == 0x4A4D4F45: detected_ext = ".obj"
-            elif magic_int == 0x00000002: detected_ext = ".fmt_02"
-        if base_name_known: name_part = os.path.splitext(base_name_known)[0]; relative_path = name_part + detected_ext
-        else: relative_path = os.path.join("__Unknown", f"{entry.dwHash:08X}{detected_ext}")
-        relative_path = relative_path.replace('/', os.path.sep).replace('\\', os.path.sep)
-        return relative_path, detected_ext
+        detected_ext = DatUnpack.iGetTypeFromMagic(magic_int)
+        return DatUnpack.iGetRelativePath(entry.dwHash, detected_ext), detected_ext
+
+    @staticmethod
+    def iSelectEntries(m_Table: DatEntryTable, entry_filter: Optional[DatFilter] = None) -> List[DatEntry]:
+        if entry_filter is None or entry_filter.is_empty(): return m_Table.entries()
+        return m_Table.entries([i for i, m in enumerate(entry_filter.iMaskIndex(m_Table)) if m])
+
+    @staticmethod
+    def iResolveEntries(m_Archive: str, m_Entries: List[DatEntry], entry_filter: Optional[DatFilter] = None) -> List[Tuple[DatEntry, str, str]]:
+        with UnpackSession(m_Archive) as m_Session: return m_Session.resolve(m_Entries, entry_filter)
 
     @staticmethod
-    def iDoIt(m_Archive: str, m_DstFolder: str, output_queue: queue.Queue):
+    def iListEntries(m_Archive: str, entry_filter: Optional[DatFilter] = None) -> Tuple[List[Tuple[DatEntry, str, str]], int]:
+        with UnpackSession(m_Archive, entry_filter=entry_filter) as m_Session: return m_Session.resolve(), len(m_Session.m_Table)
+
+    @staticmethod
+    def iPlanOutputs(m_DstFolder: str, m_Resolved: List[Tuple[DatEntry, str, str]]) -> Dict[str, Tuple[DatEntry, str, str]]:
+        m_Jobs: Dict[str, Tuple[DatEntry, str, str]] = {}
+        for m_Entry, relative_path, _ in m_Resolved:
+            relative_path_os = relative_path.replace('/', os.path.sep).replace('\\', os.path.sep)
+            m_FullPath = os.path.normpath(os.path.join(m_DstFolder, relative_path_os))
+            # Entries resolving to the same path overwrite each other; only the last one survives.
+            m_Jobs.pop(m_FullPath, None)
+            m_Jobs[m_FullPath] = (m_Entry, relative_path_os, m_FullPath)
+        return m_Jobs
+
+    @staticmethod
+    def iSplitByBytes(m_Jobs: List[Tuple[DatEntry, str, str]], chunk_count: int) -> List[List[Tuple[DatEntry, str, str]]]:
+        total_bytes = sum(job[0].dwSize for job in m_Jobs); m_Chunks: List[List[Tuple[DatEntry, str, str]]] = [[]]; acc = 0
+        for job in m_Jobs:
+            if acc >= total_bytes * len(m_Chunks) / chunk_count and len(m_Chunks) < chunk_count and m_Chunks[-1]: m_Chunks.append([])
+            m_Chunks[-1].append(job); acc += job[0].dwSize
+        return m_Chunks
+
+    @staticmethod
+    def iVerify(m_Archive: str, m_DstFolder: str, entry_filter: Optional[DatFilter] = None) -> List[Tuple[str, str]]:
+        with UnpackSession(m_Archive, m_DstFolder, entry_filter=entry_filter) as m_Session: return m_Session.verify()
+
+    @staticmethod
+    def iDoIt(m_Archive: str, m_DstFolder: str, output_queue: queue.Queue, preallocate: bool = True, drop_cache: bool = False, resume: bool = False, verify_digest: bool = False, entry_filter: Optional[DatFilter] = None, workers: int = 1, dedup: bool = False, sink: Optional[DatSink] = None, benchmark: bool = False, pipeline_bytes: int = 0, converter=None):
+        if not DatHashList._list_loaded:
+            output_queue.put("ERROR: Hash list not loaded.")
+            return
+        m_Session = UnpackSession(m_Archive, m_DstFolder, None, preallocate, drop_cache, resume, verify_digest, entry_filter, workers, dedup, sink, benchmark, pipeline_bytes, converter)
+        try: m_Session.run(output_queue)
+        finally: m_Session.close()
+
+    @staticmethod
+    def iGetBatchFolders(m_Archives: List[str], m_DstFolder: str) -> List[str]:
+        # Labels must stay unique (case-insensitively, for Windows folders): sinks key their output on them.
+        m_Folders: List[str] = []; m_Taken: set = set()
+        for m_Archive in m_Archives:
+            name = stem = os.path.splitext(os.path.basename(m_Archive))[0]; n = 1
+            while name.lower() in m_Taken: n += 1; name = f"{stem}_{n}"
+            m_Taken.add(name.lower())
+            m_Folders.append(os.path.join(m_DstFolder, name))
+        return m_Folders
+
+    @staticmethod
+    def iDoItBatch(m_Archives: List[str], m_DstFolder: str, output_queue: queue.Queue, preallocate: bool = True, drop_cache: bool = False, resume: bool = False, verify_digest: bool = False, entry_filter: Optional[DatFilter] = None, workers: int = 4, dedup: bool = False, sink: Optional[DatSink] = None, benchmark: bool = False, converter=None):
+        if not DatHashList._list_loaded:
+            output_queue.put("ERROR: Hash list not loaded.")
+            return
+        workers = max(1, workers); name_index = DatNameIndex.iFromHashList()
+        m_Sessions = [UnpackSession(m_Archive, m_Folder, name_index, preallocate, drop_cache, resume, verify_digest, entry_filter, dedup=dedup, sink=sink, benchmark=benchmark, converter=converter)
+                      for m_Archive, m_Folder in zip(m_Archives, DatUnpack.iGetBatchFolders(m_Archives, m_DstFolder))]
+        for m_Session in m_Sessions: m_Session.label = os.path.basename(os.path.normpath(m_Session.m_DstFolder))
         try:
-            if not DatHashList._list_loaded:
-                output_queue.put("ERROR: Hash list not loaded.")
-                return
-            m_DstFolder = Utils.iCheckArgumentsPath(m_DstFolder)
-            DatUnpack.m_EntryTable.clear();
-            try:
-                with open(m_Archive, 'rb') as TDatStream:
-                    while True:
-                        entry_data = TDatStream.read(12)
-                        if len(entry_data) < 12: break
-                        dwHash, dwOffset, dwSize = struct.unpack('<IIi', entry_data)
-                        if dwHash == 0 and dwOffset == 0 and dwSize == 0: break
-                        if dwSize < 0: continue
-                        DatUnpack.m_EntryTable.append(DatEntry(dwHash, dwOffset, dwSize))
-            except FileNotFoundError: output_queue.put(f"ERROR: Archive not found: {m_Archive}"); return
-            except Exception as read_err: output_queue.put(f"ERROR: Failed reading index: {read_err}"); return
-            total_entries = len(DatUnpack.m_EntryTable)
-            if total_entries == 0: output_queue.put("WARNING: No file entries found in the archive."); return
-            processed_count = 0
-            try:
-                os.makedirs(m_DstFolder, exist_ok=True)
-                if not DatHashList._list_load_success or not DatHashList.m_HashList:
-                     os.makedirs(os.path.join(m_DstFolder, "__Unknown"), exist_ok=True)
-            except Exception: pass
-            for index, m_Entry in enumerate(DatUnpack.m_EntryTable):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as m_Pool:
+                # Sessions that fail to prepare drop out of the run but are still closed below.
+                m_Prepared = [m_Session for m_Session, ok in zip(m_Sessions, m_Pool.map(lambda m_Session: m_Session.prepare(output_queue), m_Sessions)) if ok]
+                total_bytes = sum(job[0].dwSize for m_Session in m_Prepared for job in m_Session.m_Pending)
+                output_queue.put(f"INFO: Batch of {len(m_Sessions)} archives, {sum(len(m_Session.m_Pending) for m_Session in m_Prepared)} entries, {total_bytes} bytes.")
+                # Cut every archive into runs of roughly equal bytes and hand the largest out first, so one pool stays busy across all archives.
+                target_bytes = max(1, total_bytes // (workers * 4))
+                m_Tasks = [(sum(job[0].dwSize for job in m_Chunk), m_Session, m_Chunk)
+                           for m_Session in m_Prepared
+                           for m_Chunk in DatUnpack.iSplitByBytes(m_Session.m_Pending, max(1, -(-sum(job[0].dwSize for job in m_Session.m_Pending) // target_bytes))) if m_Chunk]
+                m_Tasks.sort(key=lambda task: task[0], reverse=True)
                 try:
-                     relative_path, _ = DatUnpack.detect_file_type_and_name(m_Archive, m_Entry)
-                     relative_path_os = relative_path.replace('/', os.path.sep).replace('\\', os.path.sep)
-                     m_FullPath = os.path.join(m_DstFolder, relative_path_os)
-                     m_FullPath = os.path.normpath(m_FullPath)
-                     output_queue.put(relative_path_os)
-                     DatHelpers.ReadWriteFile(m_Archive, m_FullPath, m_Entry.dwOffset, m_Entry.dwSize)
-                     processed_count += 1
-                except Exception as extract_err:
-                     output_queue.put(f"ERROR extracting {relative_path_os}: {extract_err}")
-                     pass
-        except Exception as e: output_queue.put(f"FATAL ERROR during unpack: {e}")
+                    for m_Future in [m_Pool.submit(m_Session.extract, m_Chunk, output_queue) for _, m_Session, m_Chunk in m_Tasks]: m_Future.result()
+                finally:
+                    for m_Session in m_Prepared: m_Session.finish(output_queue)
+        except Exception as e: output_queue.put(f"FATAL ERROR during batch unpack: {e}")
+        finally:
+            for m_Session in m_Sessions: m_Session.close()
+
+class DatCatalog:
+    # Columnar view of one archive's resolved entries; directory children are only gathered and sorted when a folder is first expanded.
+    SORT_COLUMNS = ("name", "type", "size", "offset")
+
+    def __init__(self, m_Archive: str, m_Resolved: List[Tuple[DatEntry, str, str]]):
+        self.m_Archive = m_Archive
+        self.m_Hashes = array('I', (r[0].dwHash for r in m_Resolved))
+        self.m_Offsets = array('I', (r[0].dwOffset for r in m_Resolved))
+        self.m_Sizes = array('q', (r[0].dwSize for r in m_Resolved))
+        self.m_Names: List[str] = [r[1].replace(os.path.sep, '/').replace('\\', '/') for r in m_Resolved]
+        self.m_Exts: List[str] = [r[2] for r in m_Resolved]
+        self.m_DirFiles: Dict[str, List[int]] = {}
+        self.m_DirChildren: Dict[str, set] = {"": set()}
+        for index, name in enumerate(self.m_Names):
+            dir_name = name.rpartition('/')[0]
+            m_Files = self.m_DirFiles.get(dir_name)
+            if m_Files is None:
+                self.m_DirFiles[dir_name] = m_Files = []
+                while dir_name:
+                    parent = dir_name.rpartition('/')[0]; parent_known = parent in self.m_DirChildren
+                    self.m_DirChildren.setdefault(dir_name, set())
+                    self.m_DirChildren.setdefault(parent, set()).add(dir_name)
+                    if parent_known: break
+                    dir_name = parent
+            m_Files.append(index)
+        self.m_Sorted: Dict[str, Tuple[List[str], List[int]]] = {}
+        self.m_Orders: Dict[Tuple[str, bool], array] = {}
+        self.m_Ranks: Dict[str, array] = {}
+
+    @staticmethod
+    def iLoad(m_Archive: str, name_index: Optional[DatNameIndex] = None) -> 'DatCatalog':
+        with UnpackSession(m_Archive, name_index=name_index) as m_Session: return DatCatalog(m_Archive, m_Session.resolve())
+
+    def __len__(self) -> int: return len(self.m_Names)
+
+    def entry(self, index: int) -> DatEntry: return DatEntry(self.m_Hashes[index], self.m_Offsets[index], self.m_Sizes[index])
+
+    def children(self, dir_name: str) -> Tuple[List[str], List[int]]:
+        m_Children = self.m_Sorted.get(dir_name)
+        if m_Children is None:
+            m_Children = (sorted(self.m_DirChildren.get(dir_name, ()), key=str.lower), sorted(self.m_DirFiles.get(dir_name, ()), key=lambda i: self.m_Names[i].lower()))
+            self.m_Sorted[dir_name] = m_Children
+        return m_Children
+
+    def order(self, column: str, descending: bool = False) -> array:
+        # Entry indices sorted by one column, computed once per column and direction and then reused by every view.
+        m_Order = self.m_Orders.get((column, descending))
+        if m_Order is not None: return m_Order
+        if descending: m_Order = array('I', reversed(self.order(column)))
+        else:
+            if column == "name": m_Keys = [name.lower() for name in self.m_Names]
+            elif column == "type": m_Keys = [(ext, name.lower()) for ext, name in zip(self.m_Exts, self.m_Names)]
+            elif column == "size": m_Keys = self.m_Sizes
+            elif column == "offset": m_Keys = self.m_Offsets
+            else: raise ValueError(f"Unknown sort column: {column}")
+            m_Order = array('I', sorted(range(len(self.m_Names)), key=m_Keys.__getitem__))
+        self.m_Orders[(column, descending)] = m_Order
+        return m_Order
+
+    def rank(self, column: str) -> array:
+        m_Rank = self.m_Ranks.get(column)
+        if m_Rank is None:
+            m_Rank = array('I', bytes(4 * len(self.m_Names)))
+            for position, index in enumerate(self.order(column)): m_Rank[index] = position
+            self.m_Ranks[column] = m_Rank
+        return m_Rank
+
+    def sorted_ids(self, m_Ids, column: str, descending: bool = False) -> List[int]:
+        return sorted(m_Ids, key=self.rank(column).__getitem__, reverse=descending)
+
+    def dir_size(self, dir_name: str) -> int:
+        return len(self.m_DirFiles.get(dir_name, ())) + len(self.m_DirChildren.get(dir_name, ()))
+
+    def visible_rows(self, m_Expanded: set, column: str = "name", descending: bool = False) -> List[Tuple[int, bool, object]]:
+        # (depth, is_dir, dir name or entry index) for every row a tree view with these folders open would show.
+        m_Rows: List[Tuple[int, bool, object]] = []
+        m_Stack: List[Tuple[int, bool, object]] = [(0, True, "")]
+        while m_Stack:
+            depth, is_dir, key = m_Stack.pop()
+            if key != "": m_Rows.append((depth - 1, is_dir, key))
+            if not is_dir or (key != "" and key not in m_Expanded): continue
+            m_Dirs, m_Files = self.children(key)
+            if column != "name" or descending: m_Files = self.sorted_ids(m_Files, column, descending)
+            m_Stack.extend((depth + 1, False, index) for index in reversed(m_Files))
+            m_Stack.extend((depth + 1, True, child) for child in reversed(m_Dirs))
+        return m_Rows
+
+class DatSearchIndex:
+    # Trigram postings over lower-cased names from any number of catalogs. A substring query walks the rarest trigram's
+    # posting list and checks each candidate, so the cost follows the number of plausible matches, not the catalog size.
+    GRAM = 3
+
+    def __init__(self, m_Catalogs: List[DatCatalog]):
+        self.m_Catalogs = m_Catalogs
+        self.m_Starts: List[int] = []
+        self.m_Names: List[str] = []
+        self.m_Grams: Dict[str, array] = {}
+        self.m_ByExt: Dict[str, array] = {}
+        m_Hashes: List[Tuple[str, int]] = []
+        for m_Catalog in m_Catalogs:
+            self.m_Starts.append(len(self.m_Names))
+            for index, name in enumerate(m_Catalog.m_Names):
+                entry_id = len(self.m_Names); name = name.lower()
+                self.m_Names.append(name)
+                for gram in {name[i:i + DatSearchIndex.GRAM] for i in range(len(name) - DatSearchIndex.GRAM + 1)}:
+                    m_Ids = self.m_Grams.get(gram)
+                    if m_Ids is None: self.m_Grams[gram] = m_Ids = array('I')
+                    m_Ids.append(entry_id)
+                ext = m_Catalog.m_Exts[index].lstrip('.').lower()
+                m_Ids = self.m_ByExt.get(ext)
+                if m_Ids is None: self.m_ByExt[ext] = m_Ids = array('I')
+                m_Ids.append(entry_id)
+                m_Hashes.append((f"{m_Catalog.m_Hashes[index]:08x}", entry_id))
+        m_Hashes.sort()
+        self.m_HashKeys = [key for key, _ in m_Hashes]
+        self.m_HashIds = array('I', (entry_id for _, entry_id in m_Hashes))
+        self.m_Last: Tuple[List[Tuple[str, str]], List[int]] = ([], [])
+
+    def __len__(self) -> int: return len(self.m_Names)
+
+    def locate(self, entry_id: int) -> Tuple[DatCatalog, int]:
+        catalog_index = bisect.bisect_right(self.m_Starts, entry_id) - 1
+        return self.m_Catalogs[catalog_index], entry_id - self.m_Starts[catalog_index]
+
+    @staticmethod
+    def iParse(query: str) -> List[Tuple[str, str]]:
+        # "ext:dds" matches the detected type, "hash:1A2B" or "0x1A2B" a hash prefix; any other word is a name substring.
+        m_Terms: List[Tuple[str, str]] = []
+        for word in query.lower().split():
+            if word.startswith("ext:"): m_Terms.append(("ext", word[4:].lstrip('.')))
+            elif word.startswith("hash:"): m_Terms.append(("hash", word[5:]))
+            elif word.startswith("0x") and len(word) > 2: m_Terms.append(("hash", word[2:]))
+            else: m_Terms.append(("name", word))
+        return [term for term in m_Terms if term[1]]
+
+    def candidates(self, kind: str, value: str):
+        if kind == "ext": return self.m_ByExt.get(value, ())
+        if kind == "hash":
+            start = bisect.bisect_left(self.m_HashKeys, value)
+            end = bisect.bisect_left(self.m_HashKeys, value + "g", start)
+            return sorted(self.m_HashIds[start:end])
+        if len(value) < DatSearchIndex.GRAM: return None
+        m_Postings = [self.m_Grams.get(value[i:i + DatSearchIndex.GRAM], ()) for i in range(len(value) - DatSearchIndex.GRAM + 1)]
+        return min(m_Postings, key=len)
+
+    @staticmethod
+    def iNarrows(m_Last: List[Tuple[str, str]], m_Terms: List[Tuple[str, str]]) -> bool:
+        # True when every match of m_Last's query also matches m_Terms: same words of the same kind, the last one possibly
+        # typed further (a longer name substring or hash prefix), then any number of extra words.
+        if not m_Last or len(m_Terms) < len(m_Last) or m_Terms[:len(m_Last) - 1] != m_Last[:-1]: return False
+        (last_kind, last_value), (kind, value) = m_Last[-1], m_Terms[len(m_Last) - 1]
+        return kind == last_kind and (value == last_value or (kind != "ext" and value.startswith(last_value)))
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[int]:
+        m_Terms = DatSearchIndex.iParse(query)
+        if not m_Terms: self.m_Last = ([], []); return []
+        # Start from the smallest candidate set; names shorter than a trigram fall back to checking every entry.
+        m_Sets = [(self.candidates(kind, value), kind, value) for kind, value in m_Terms]
+        m_Sets.sort(key=lambda item: len(item[0]) if item[0] is not None else len(self.m_Names))
+        m_Base = m_Sets[0][0] if m_Sets[0][0] is not None else range(len(self.m_Names))
+        # When the new terms only narrow the previous ones, the previous results are candidates too. Raw string prefixes are not
+        # enough: "0x" is a name word but "0x1" a hash prefix.
+        m_LastTerms, m_LastResults = self.m_Last
+        if DatSearchIndex.iNarrows(m_LastTerms, m_Terms) and len(m_LastResults) < len(m_Base): m_Base = m_LastResults
+        m_Checks = [(kind, value if kind == "name" else (set(ids) if ids is not None else None)) for ids, kind, value in m_Sets]
+        m_Results: List[int] = []
+        for entry_id in m_Base:
+            name = self.m_Names[entry_id]
+            for kind, check in m_Checks:
+                if kind == "name":
+                    if check not in name: break
+                elif entry_id not in check: break
+            else:
+                m_Results.append(entry_id)
+                if limit is not None and len(m_Results) >= limit: break
+        if limit is None: self.m_Last = (m_Terms, m_Results)
+        return m_Results
@@ -8,7 +8,8 @@ import pathlib
 import threading
 import queue
 import time
-from typing import Optional, List, Tuple
+from collections import deque
+from typing import Optional, List, Tuple, Deque, TextIO
 
 import tkinter as tk
 from tkinter import filedialog
@@ -27,7 +28,9 @@ except ImportError as e:
     sys.exit(1)
 
 try:
-    from functions import DatHashList, DatUnpack
+    from functions import DatHashList, DatProgress, DatFilter, DatNameIndex, DatCatalog, DatSearchIndex, UnpackSession
+    from preview import PREVIEW_EXTS, PreviewDecoder, TextureCache, preview_unavailable
+    from dds import DdsPngConverter, decoder_unavailable
 except ImportError:
     try:
         root = tk.Tk(); root.withdraw()
@@ -39,13 +42,46 @@ except ImportError:
 g_archive_path: Optional[str] = None
 g_output_path: Optional[str] = None
 g_status_message: str = "Initializing..."
-g_is_unpacking: bool = False
-g_unpacking_thread: Optional[threading.Thread] = None
+g_session: Optional[UnpackSession] = None
+g_session_reported: bool = True
 g_hash_list_thread: Optional[threading.Thread] = None
 g_first_frame_completed = False
 g_unpacked_files_queue = queue.Queue()
-g_unpacked_files_list: List[str] = []
-g_unpack_started = False
+LOG_LINES = 20000
+LOG_ITEMS_PER_FRAME = 64
+LOG_FILE_NAME = "cedat-unpack.log"
+g_unpacked_files_list: Deque[str] = deque(maxlen=LOG_LINES)
+g_log_to_file: bool = False
+g_log_file: Optional[TextIO] = None
+g_resume_extraction: bool = True
+g_verify_digests: bool = False
+g_dedup_outputs: bool = False
+g_convert_dds: bool = False
+g_converter: Optional[DdsPngConverter] = None
+g_filter_globs: str = ""
+g_filter_regex: str = ""
+g_filter_exts: str = ""
+g_filter_hashes: str = ""
+g_filter_min_size: int = 0
+g_filter_max_size: int = 0
+BROWSER_HEIGHT = 300
+g_catalog: Optional[DatCatalog] = None
+g_catalog_path: Optional[str] = None
+g_catalog_thread: Optional[threading.Thread] = None
+g_catalog_error: str = ""
+g_browser_expanded: set = set()
+g_browser_rows: Optional[List[Tuple[int, bool, object]]] = None
+g_search_index: Optional[DatSearchIndex] = None
+g_search_query: str = ""
+g_search_results: Optional[List[int]] = None
+g_sorted_results: Optional[List[int]] = None
+g_browser_sort: Tuple[str, bool] = ("name", False)
+g_browser_flat: bool = False
+PREVIEW_HEIGHT = 256
+g_preview_index: Optional[int] = None
+g_preview_error: Optional[Tuple[Tuple[str, int], str]] = None
+g_preview_decoder = PreviewDecoder()
+g_texture_cache = TextureCache()
 
 def load_hash_list_thread_entrypoint():
     global g_status_message
@@ -61,25 +97,147 @@ def load_hash_list_thread_entrypoint():
         DatHashList._list_load_success = False
         DatHashList.set_loading_status(False)
 
-def run_unpacking_thread(archive_path: str, output_path: str, output_queue: queue.Queue):
-    global g_status_message, g_is_unpacking, g_unpack_started
-    try:
-        if not DatHashList._list_loaded:
-            g_status_message = "Cannot unpack: Hash list loading not finished."
-            g_is_unpacking = False; return
-        g_status_message = "Processing..."
-        g_unpack_started = True
-        DatUnpack.iDoIt(archive_path, output_path, output_queue)
-        g_status_message = "Unpacking process finished."
-    except Exception as e:
-        g_status_message = f"Error during unpacking: {type(e).__name__}"
-        output_queue.put(f"THREAD ERROR: {e}")
-    finally: g_is_unpacking = False
+def load_catalog_thread_entrypoint(archive_path: str):
+    global g_catalog, g_catalog_path, g_catalog_error, g_browser_expanded, g_browser_rows, g_search_index, g_search_results, g_sorted_results
+    global g_preview_index
+    try: m_Catalog = DatCatalog.iLoad(archive_path); m_SearchIndex = DatSearchIndex([m_Catalog])
+    except Exception as e: g_catalog_error = f"Could not read archive: {e}"; return
+    g_catalog, g_catalog_path, g_catalog_error, g_browser_expanded, g_browser_rows = m_Catalog, archive_path, "", set(), None
+    g_search_index, g_search_results, g_sorted_results, g_preview_index = m_SearchIndex, None, None, None
+
+def begin_entry_table(table_id: str, name_label: str) -> bool:
+    global g_browser_sort, g_browser_rows, g_sorted_results
+    table_flags = (imgui.TableFlags_.borders_v.value | imgui.TableFlags_.row_bg.value | imgui.TableFlags_.resizable.value |
+                   imgui.TableFlags_.scroll_y.value | imgui.TableFlags_.sortable.value)
+    if not imgui.begin_table(table_id, 4, table_flags, ImVec2(-1, BROWSER_HEIGHT)): return False
+    imgui.table_setup_scroll_freeze(0, 1)
+    imgui.table_setup_column(name_label, imgui.TableColumnFlags_.width_stretch.value | imgui.TableColumnFlags_.default_sort.value)
+    imgui.table_setup_column("Type", imgui.TableColumnFlags_.width_fixed.value, 60)
+    imgui.table_setup_column("Size", imgui.TableColumnFlags_.width_fixed.value, 100)
+    imgui.table_setup_column("Offset", imgui.TableColumnFlags_.width_fixed.value, 100)
+    imgui.table_headers_row()
+    sort_specs = imgui.table_get_sort_specs()
+    if sort_specs is not None and sort_specs.specs_dirty:
+        if sort_specs.specs_count > 0:
+            column_specs = sort_specs.get_specs(0)
+            m_Sort = (DatCatalog.SORT_COLUMNS[column_specs.column_index], column_specs.sort_direction == imgui.SortDirection.descending)
+            if m_Sort != g_browser_sort: g_browser_sort = m_Sort; g_browser_rows = None; g_sorted_results = None
+        sort_specs.specs_dirty = False
+    return True
+
+def draw_entry_list(m_Catalog: DatCatalog, m_Ids, table_id: str, name_label: str):
+    global g_preview_index
+    if not begin_entry_table(table_id, name_label): return
+    select_flags = imgui.SelectableFlags_.span_all_columns.value
+    clipper = imgui.ListClipper()
+    clipper.begin(len(m_Ids))
+    while clipper.step():
+        for row_index in range(clipper.display_start, clipper.display_end):
+            index = m_Ids[row_index]
+            imgui.table_next_row(); imgui.table_next_column()
+            if imgui.selectable(f"{m_Catalog.m_Names[index]}##{index}", index == g_preview_index, select_flags)[0]: g_preview_index = index
+            imgui.table_next_column(); imgui.text_unformatted(m_Catalog.m_Exts[index])
+            imgui.table_next_column(); imgui.text_unformatted(f"{m_Catalog.m_Sizes[index]:,}")
+            imgui.table_next_column(); imgui.text_unformatted(f"0x{m_Catalog.m_Offsets[index]:08X}")
+    clipper.end()
+    imgui.end_table()
+
+def draw_archive_browser():
+    global g_catalog_thread, g_catalog_error, g_browser_rows, g_browser_flat, g_search_query, g_search_results, g_sorted_results
+    global g_preview_index
+    is_loading_catalog = g_catalog_thread is not None and g_catalog_thread.is_alive()
+    can_load = g_archive_path is not None and DatHashList._list_loaded and not is_loading_catalog
+    if not can_load: imgui.begin_disabled()
+    if imgui.button("Load Entries" if g_catalog_path != g_archive_path else "Reload Entries"):
+        g_catalog_error = ""
+        g_catalog_thread = threading.Thread(target=load_catalog_thread_entrypoint, args=(g_archive_path,), daemon=True)
+        g_catalog_thread.start()
+    if not can_load: imgui.end_disabled()
+    imgui.same_line()
+    if is_loading_catalog: imgui.text("Reading entries...")
+    elif g_catalog_error: imgui.text_colored(ImVec4(1.0, 0.4, 0.4, 1.0), g_catalog_error)
+    elif g_catalog is not None: imgui.text(f"{len(g_catalog)} entries in {os.path.basename(g_catalog_path)}")
+    if g_catalog is None: return
+    m_Catalog = g_catalog
+    sort_column, sort_descending = g_browser_sort
+    _, g_browser_flat = imgui.checkbox("Flat list", g_browser_flat)
+    imgui.same_line()
+    imgui.set_next_item_width(-1)
+    search_changed, g_search_query = imgui.input_text_with_hint("##entry_search", "Search: name text, ext:dds, 0x1A2B...", g_search_query)
+    if search_changed: g_search_results = None; g_sorted_results = None
+    if g_search_query.strip():
+        if g_search_results is None: g_search_results = g_search_index.search(g_search_query)
+        if g_sorted_results is None: g_sorted_results = m_Catalog.sorted_ids(g_search_results, sort_column, sort_descending)
+        draw_entry_list(m_Catalog, g_sorted_results, "##search_results", f"Name ({len(g_search_results)} matches)")
+        return
+    # Sorting reuses the catalog's cached permutations; nothing is re-sorted per frame.
+    if g_browser_flat:
+        draw_entry_list(m_Catalog, m_Catalog.order(sort_column, sort_descending), "##flat_entries", "Name")
+        return
+    # The tree is flattened into the rows of the open folders only, and the clipper draws just the rows on screen.
+    if g_browser_rows is None: g_browser_rows = m_Catalog.visible_rows(g_browser_expanded, sort_column, sort_descending)
+    m_Rows = g_browser_rows
+    if not begin_entry_table("##archive_browser", "Name"): return
+    dir_flags = imgui.TreeNodeFlags_.no_tree_push_on_open.value | imgui.TreeNodeFlags_.span_full_width.value
+    file_flags = dir_flags | imgui.TreeNodeFlags_.leaf.value
+    selected_flag = imgui.TreeNodeFlags_.selected.value
+    indent_spacing = imgui.get_style().indent_spacing
+    clipper = imgui.ListClipper()
+    clipper.begin(len(m_Rows))
+    while clipper.step():
+        for row_index in range(clipper.display_start, clipper.display_end):
+            depth, is_dir, key = m_Rows[row_index]
+            imgui.table_next_row(); imgui.table_next_column()
+            if depth: imgui.indent(depth * indent_spacing)
+            if is_dir:
+                is_open = key in g_browser_expanded
+                imgui.set_next_item_open(is_open)
+                if imgui.tree_node_ex(f"{key.rpartition('/')[2]}##{key}", dir_flags) != is_open:
+                    if is_open: g_browser_expanded.discard(key)
+                    else: g_browser_expanded.add(key)
+                    g_browser_rows = None
+                imgui.table_next_column(); imgui.text_disabled("folder")
+                imgui.table_next_column(); imgui.text_disabled(f"{m_Catalog.dir_size(key)} items")
+            else:
+                imgui.tree_node_ex(f"{m_Catalog.m_Names[key].rpartition('/')[2]}##{key}", file_flags | (selected_flag if key == g_preview_index else 0))
+                if imgui.is_item_clicked(): g_preview_index = key
+                imgui.table_next_column(); imgui.text_unformatted(m_Catalog.m_Exts[key])
+                imgui.table_next_column(); imgui.text_unformatted(f"{m_Catalog.m_Sizes[key]:,}")
+                imgui.table_next_column(); imgui.text_unformatted(f"0x{m_Catalog.m_Offsets[key]:08X}")
+            if depth: imgui.unindent(depth * indent_spacing)
+    clipper.end()
+    imgui.end_table()
+
+def draw_preview():
+    global g_preview_error
+    if g_catalog is None or g_preview_index is None or g_preview_index >= len(g_catalog): return
+    m_Catalog, index = g_catalog, g_preview_index
+    imgui.text(m_Catalog.m_Names[index])
+    if m_Catalog.m_Exts[index] not in PREVIEW_EXTS: imgui.text_disabled("No preview for this file type."); return
+    unavailable = preview_unavailable(m_Catalog.m_Exts[index])
+    if unavailable: imgui.text_disabled(unavailable); return
+    key = (m_Catalog.m_Archive, m_Catalog.m_Hashes[index])
+    if g_preview_error is not None and g_preview_error[0] == key: imgui.text_colored(ImVec4(1.0, 0.4, 0.4, 1.0), g_preview_error[1]); return
+    m_Texture = g_texture_cache.get(key)
+    if m_Texture is None:
+        # Decoding runs off the GUI thread; the GL upload happens here because only this thread owns the context.
+        result = g_preview_decoder.take(key)
+        if result is None: g_preview_decoder.request(m_Catalog.m_Archive, m_Catalog.entry(index)); imgui.text_disabled("Decoding..."); return
+        if isinstance(result, str): g_preview_error = (key, result); return
+        try: m_Texture = g_texture_cache.put(key, result)
+        except Exception as e: g_preview_error = (key, f"Preview failed: {e}"); return
+    texture_id, width, height, source_width, source_height = m_Texture
+    imgui.text_disabled(f"{source_width} x {source_height}   ({len(g_texture_cache)} cached, {g_texture_cache.used_bytes / (1024 * 1024):.0f} MiB)")
+    scale = min(1.0, imgui.get_content_region_avail().x / width, PREVIEW_HEIGHT / height)
+    texture_ref = imgui.ImTextureRef(texture_id) if hasattr(imgui, "ImTextureRef") else texture_id
+    imgui.image(texture_ref, ImVec2(width * scale, height * scale))
 
 def gui_loop():
-    global g_archive_path, g_output_path, g_status_message, g_is_unpacking
-    global g_unpacking_thread, g_hash_list_thread, g_first_frame_completed
-    global g_unpacked_files_list, g_unpacked_files_queue, g_unpack_started
+    global g_archive_path, g_output_path, g_status_message, g_session, g_session_reported
+    global g_hash_list_thread, g_first_frame_completed
+    global g_unpacked_files_queue, g_log_to_file, g_log_file
+    global g_resume_extraction, g_verify_digests, g_dedup_outputs, g_convert_dds, g_converter
+    global g_filter_globs, g_filter_regex, g_filter_exts, g_filter_hashes, g_filter_min_size, g_filter_max_size
 
     if not g_first_frame_completed:
         g_first_frame_completed = True
@@ -88,15 +246,27 @@ def gui_loop():
             g_hash_list_thread = threading.Thread(target=load_hash_list_thread_entrypoint, daemon=True)
             g_hash_list_thread.start()
 
-    while not g_unpacked_files_queue.empty():
-        try:
-            item = g_unpacked_files_queue.get_nowait()
-            g_unpacked_files_list.append(str(item))
+    # Bounded work per frame; the session already sends file names in batches.
+    for _ in range(LOG_ITEMS_PER_FRAME):
+        try: item = g_unpacked_files_queue.get_nowait()
         except queue.Empty: break
-        except Exception: pass
+        except Exception: break
+        if isinstance(item, dict): continue
+        m_Lines = [str(line) for line in item] if isinstance(item, list) else [str(item)]
+        g_unpacked_files_list.extend(m_Lines)
+        if g_log_file is not None:
+            try: g_log_file.write("\n".join(m_Lines) + "\n")
+            except Exception: g_log_file = None
+
+    is_unpacking = g_session is not None and g_session.is_running()
+    if g_log_file is not None and not is_unpacking and g_unpacked_files_queue.empty():
+        g_log_file.close(); g_log_file = None
+    if g_session is not None and not is_unpacking and not g_session_reported:
+        g_status_message = g_session.status_message
+        g_session_reported = True
 
     is_loading_hashes, hash_loading_progress = DatHashList.get_loading_status()
-    disable_ui = is_loading_hashes or g_is_unpacking
+    disable_ui = is_loading_hashes or is_unpacking
     content_region = imgui.get_content_region_avail()
 
     imgui.text("Input Archive (.dat):")
@@ -137,33 +307,82 @@ def gui_loop():
     imgui.text_wrapped(g_output_path if g_output_path else "None")
 
     imgui.separator()
+    if disable_ui: imgui.begin_disabled()
+    _, g_resume_extraction = imgui.checkbox("Skip unchanged files", g_resume_extraction)
+    imgui.same_line()
+    if not g_resume_extraction: imgui.begin_disabled()
+    _, g_verify_digests = imgui.checkbox("Verify digests", g_verify_digests)
+    if not g_resume_extraction: imgui.end_disabled()
+    imgui.same_line()
+    _, g_dedup_outputs = imgui.checkbox("Hardlink duplicates", g_dedup_outputs)
+    imgui.same_line()
+    convert_unavailable = decoder_unavailable()
+    if convert_unavailable: imgui.begin_disabled()
+    _, g_convert_dds = imgui.checkbox("DDS to PNG", g_convert_dds and not convert_unavailable)
+    if convert_unavailable: imgui.end_disabled()
+    if imgui.is_item_hovered(imgui.HoveredFlags_.allow_when_disabled.value): imgui.set_tooltip(convert_unavailable or "Also write a PNG of mip 0 next to every extracted .dds, in background processes.")
+    imgui.same_line()
+    _, g_log_to_file = imgui.checkbox("Save full log", g_log_to_file)
+    if imgui.is_item_hovered(): imgui.set_tooltip(f"The window keeps the last {LOG_LINES} lines; this writes every line to {LOG_FILE_NAME} in the output folder.")
+    if imgui.collapsing_header("Filters"):
+        _, g_filter_globs = imgui.input_text("Name globs", g_filter_globs)
+        _, g_filter_regex = imgui.input_text("Name regex", g_filter_regex)
+        _, g_filter_exts = imgui.input_text("Extensions", g_filter_exts)
+        _, g_filter_hashes = imgui.input_text("Hashes (hex)", g_filter_hashes)
+        _, g_filter_min_size = imgui.input_int("Min size", g_filter_min_size)
+        _, g_filter_max_size = imgui.input_int("Max size", g_filter_max_size)
+    if disable_ui: imgui.end_disabled()
+    if not is_loading_hashes and imgui.collapsing_header("Archive Browser"): draw_archive_browser(); draw_preview()
     can_unpack = (
         g_archive_path is not None and
         g_output_path is not None and
-        not g_is_unpacking and
+        not is_unpacking and
         DatHashList._list_loaded and not is_loading_hashes
     )
-    if not can_unpack: imgui.begin_disabled()
-    button_pressed = imgui.button("Unpack Archive", size=ImVec2(content_region.x, 0))
-    if not can_unpack: imgui.end_disabled()
+    button_pressed = False
+    if is_unpacking:
+        button_width = (content_region.x - imgui.get_style().item_spacing.x) / 2
+        if imgui.button("Resume" if g_session.is_paused() else "Pause", size=ImVec2(button_width, 0)):
+            if g_session.is_paused(): g_session.unpause()
+            else: g_session.pause()
+        imgui.same_line()
+        if g_session.is_cancelled(): imgui.begin_disabled()
+        if imgui.button("Cancel", size=ImVec2(button_width, 0)): g_session.cancel()
+        if g_session.is_cancelled(): imgui.end_disabled()
+    else:
+        if not can_unpack: imgui.begin_disabled()
+        button_pressed = imgui.button("Unpack Archive", size=ImVec2(content_region.x, 0))
+        if not can_unpack: imgui.end_disabled()
+
+    entry_filter = None
+    if button_pressed and can_unpack:
+        try: entry_filter = DatFilter.iFromStrings(g_filter_globs, g_filter_regex, g_filter_exts, g_filter_hashes, g_filter_min_size, g_filter_max_size)
+        except Exception as filter_e:
+            g_status_message = f"Invalid filter: {filter_e}"
+            button_pressed = False
 
     if button_pressed and can_unpack:
-        g_is_unpacking = True
-        g_status_message = "Starting unpacking..."
         g_unpacked_files_list.clear()
-        g_unpack_started = False
-        while not g_unpacked_files_queue.empty():
-            try: g_unpacked_files_queue.get_nowait()
-            except queue.Empty: break
-        g_unpacking_thread = threading.Thread(target=run_unpacking_thread, args=(str(g_archive_path), str(g_output_path), g_unpacked_files_queue), daemon=True)
-        g_unpacking_thread.start()
+        g_unpacked_files_queue = queue.Queue()
+        if g_log_file is not None: g_log_file.close(); g_log_file = None
+        if g_log_to_file:
+            try: g_log_file = open(os.path.join(str(g_output_path), LOG_FILE_NAME), 'w', encoding='utf-8', errors='replace')
+            except Exception as log_e: g_status_message = f"Could not open log file: {log_e}"
+        # The converter's worker processes are started once and reused by later unpacks.
+        if g_convert_dds and g_converter is None: g_converter = DdsPngConverter()
+        g_session = UnpackSession(str(g_archive_path), str(g_output_path), DatNameIndex.iFromHashList(),
+                                  resume=g_resume_extraction, verify_digest=g_verify_digests, entry_filter=entry_filter, dedup=g_dedup_outputs,
+                                  converter=g_converter if g_convert_dds else None)
+        g_session_reported = False
+        g_session.start(g_unpacked_files_queue)
+        is_unpacking = True
 
     imgui.separator()
     if not is_loading_hashes:
         imgui.text("Status:")
         imgui.same_line()
-        imgui.text_wrapped(g_status_message)
-        if g_is_unpacking:
+        imgui.text_wrapped(g_session.status_message if is_unpacking else g_status_message)
+        if is_unpacking and not g_session.is_paused():
             imgui.same_line()
             try:
                 time_secs = imgui.get_time()
@@ -173,15 +392,22 @@ def gui_loop():
             except AttributeError: imgui.text("...")
             except Exception as spin_e: imgui.text(f"(Spinner Error: {type(spin_e).__name__})")
 
-    if not is_loading_hashes and g_unpack_started:
+    if not is_loading_hashes and g_session is not None:
+        m_Snapshot = g_session.progress.snapshot()
+        imgui.progress_bar(DatProgress.iFraction(m_Snapshot), ImVec2(-1, 0), DatProgress.iFormat(m_Snapshot))
         imgui.separator()
         imgui.text("Unpack Log:")
         log_height = imgui.get_content_region_avail().y - 10
         imgui.begin_child("##unpack_log_child", size=ImVec2(-1, max(50, log_height)), child_flags=1)
-        for file_path in g_unpacked_files_list:
-            imgui.indent(5)
-            imgui.text_unformatted(file_path)
-            imgui.unindent(5)
+        # Only the rows inside the visible scroll range are submitted, so frame time does not grow with the log.
+        imgui.indent(5)
+        clipper = imgui.ListClipper()
+        clipper.begin(len(g_unpacked_files_list))
+        while clipper.step():
+            for line_index in range(clipper.display_start, clipper.display_end):
+                imgui.text_unformatted(g_unpacked_files_list[line_index])
+        clipper.end()
+        imgui.unindent(5)
         if imgui.get_scroll_y() >= imgui.get_scroll_max_y():
             imgui.set_scroll_here_y(1.0)
         imgui.end_child()
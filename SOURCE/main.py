@@ -5,6 +5,7 @@
 import os
 import sys
 import ctypes 
+import multiprocessing
 import tkinter as tk 
 from tkinter import messagebox
 
@@ -43,6 +44,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # The DDS to PNG converter starts worker processes; frozen builds need this to run them.
+    multiprocessing.freeze_support()
     script_dir = os.path.dirname(os.path.abspath(__file__))
     if not getattr(sys, 'frozen', False):
          try:
@@ -0,0 +1,139 @@
+# preview.py
+# Texture previews for the archive browser. Entries are decoded on a background thread straight from the mapped
+# archive; the GUI thread uploads the pixels and keeps recently viewed textures in an LRU cache under a memory budget.
+
+import io
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+from functions import DatEntry, UnpackSession
+import dds
+
+try: from OpenGL import GL
+except ImportError: GL = None
+try: from PIL import Image
+except ImportError: Image = None
+
+PREVIEW_EXTS = (".dds", ".png")
+MAX_PREVIEW_SIDE = 1024
+CACHE_BUDGET = 256 * 1024 * 1024
+
+DecodedImage = Tuple[int, int, bytes, int, int]
+
+def preview_unavailable(ext: str) -> str:
+    # NumPy covers the common DDS formats; Pillow is still needed for PNG and for DDS formats dds.py does not decode.
+    if GL is None: return "Previews need PyOpenGL: pip install PyOpenGL"
+    if ext == ".dds" and dds.load_numpy() is not None: return ""
+    if Image is None: return "Previews need Pillow: pip install pillow"
+    return ""
+
+def decode_rgba(m_View: memoryview) -> DecodedImage:
+    # Returns (width, height, RGBA pixels, source width, source height); large images are scaled down to the preview size.
+    if m_View[:4] == dds.DDS_MAGIC and dds.load_numpy() is not None:
+        try: return decode_dds(m_View)
+        except dds.DdsError as dds_err:
+            # ATI1/ATI2, BC4-BC7 and other formats dds.py does not decode go to Pillow when it is installed.
+            if Image is None: raise dds.DdsError(f"{dds_err} Install Pillow for more DDS formats: pip install pillow") from dds_err
+    with Image.open(io.BytesIO(m_View)) as m_Image:
+        source_size = m_Image.size
+        m_Image = m_Image.convert("RGBA")
+        m_Image.thumbnail((MAX_PREVIEW_SIDE, MAX_PREVIEW_SIDE))
+        return m_Image.width, m_Image.height, m_Image.tobytes(), source_size[0], source_size[1]
+
+def decode_dds(m_View: memoryview) -> DecodedImage:
+    m_Header = dds.DdsHeader.iParse(m_View)
+    # The first mip level that fits is decoded instead of the top level plus a resize.
+    level = next((i for i in range(m_Header.mip_count) if max(m_Header.level_dims(i)) <= MAX_PREVIEW_SIDE), m_Header.mip_count - 1)
+    m_Pixels = dds.decode_level(m_View, m_Header, level)
+    step = -(-max(m_Pixels.shape[:2]) // MAX_PREVIEW_SIDE)
+    if step > 1: m_Pixels = m_Pixels[::step, ::step]
+    return m_Pixels.shape[1], m_Pixels.shape[0], m_Pixels.tobytes(), m_Header.width, m_Header.height
+
+class PreviewDecoder:
+    # One worker and one pending slot: while the selection moves quickly only the newest entry is decoded,
+    # and only the newest result is held until the GUI thread takes it.
+    def __init__(self):
+        self.m_Condition = threading.Condition()
+        self.m_Pending: Optional[Tuple[str, DatEntry]] = None
+        self.m_Busy: Optional[Tuple[str, int]] = None
+        self.m_Result: Optional[Tuple[Tuple[str, int], Union[DecodedImage, str]]] = None
+        self.m_Thread: Optional[threading.Thread] = None
+        self.closed = False
+
+    def request(self, m_Archive: str, entry: DatEntry):
+        key = (m_Archive, entry.dwHash)
+        with self.m_Condition:
+            if key == self.m_Busy or (self.m_Pending is not None and key == (self.m_Pending[0], self.m_Pending[1].dwHash)): return
+            self.m_Pending = (m_Archive, entry)
+            self.m_Condition.notify()
+            if self.m_Thread is None:
+                self.m_Thread = threading.Thread(target=self.run, name="preview-decoder", daemon=True)
+                self.m_Thread.start()
+
+    def take(self, key: Tuple[str, int]) -> Optional[Union[DecodedImage, str]]:
+        with self.m_Condition:
+            if self.m_Result is None or self.m_Result[0] != key: return None
+            result = self.m_Result[1]; self.m_Result = None
+            return result
+
+    def close(self):
+        with self.m_Condition: self.closed = True; self.m_Condition.notify()
+
+    def run(self):
+        m_Session: Optional[UnpackSession] = None
+        try:
+            while True:
+                with self.m_Condition:
+                    while self.m_Pending is None and not self.closed: self.m_Condition.wait()
+                    if self.closed: break
+                    m_Archive, entry = self.m_Pending; self.m_Pending = None
+                    self.m_Busy = (m_Archive, entry.dwHash)
+                try:
+                    if m_Session is None or m_Session.m_Archive != m_Archive:
+                        if m_Session is not None: m_Session.close()
+                        m_Session = UnpackSession(m_Archive); m_Session.open()
+                    m_View = m_Session.read_view(entry)
+                    try: result = decode_rgba(m_View)
+                    finally: m_View.release()
+                except Exception as e: result = f"Preview failed: {e}"
+                with self.m_Condition: self.m_Result = (self.m_Busy, result); self.m_Busy = None
+        finally:
+            if m_Session is not None: m_Session.close()
+
+class TextureCache:
+    # Must be used from the thread that owns the GL context. The newest texture is always kept, even when it alone exceeds the budget.
+    def __init__(self, budget_bytes: int = CACHE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.m_Textures: 'OrderedDict[Tuple[str, int], Tuple[int, int, int, int, int]]' = OrderedDict()
+
+    def __len__(self) -> int: return len(self.m_Textures)
+
+    def get(self, key: Tuple[str, int]) -> Optional[Tuple[int, int, int, int, int]]:
+        m_Texture = self.m_Textures.get(key)
+        if m_Texture is not None: self.m_Textures.move_to_end(key)
+        return m_Texture
+
+    def put(self, key: Tuple[str, int], m_Image: DecodedImage) -> Tuple[int, int, int, int, int]:
+        width, height, m_Pixels, source_width, source_height = m_Image
+        texture_id = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, width, height, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, m_Pixels)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self.discard(key)
+        m_Texture = (int(texture_id), width, height, source_width, source_height)
+        self.m_Textures[key] = m_Texture; self.used_bytes += width * height * 4
+        while self.used_bytes > self.budget_bytes and len(self.m_Textures) > 1: self.discard(next(iter(self.m_Textures)))
+        return m_Texture
+
+    def discard(self, key: Tuple[str, int]):
+        m_Texture = self.m_Textures.pop(key, None)
+        if m_Texture is None: return
+        GL.glDeleteTextures([m_Texture[0]]); self.used_bytes -= m_Texture[1] * m_Texture[2] * 4
+
+    def clear(self):
+        for key in list(self.m_Textures): self.discard(key)
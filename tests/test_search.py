@@ -0,0 +1,38 @@
+# test_search.py
+# Run from the repository root: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "SOURCE"))
+
+from functions import DatEntry, DatCatalog, DatSearchIndex
+
+def make_index() -> DatSearchIndex:
+    m_Resolved = [(DatEntry(0x12000000 + i * 0x00100000, i * 16, 16), f"LEVEL{i % 3}/HASH_{i:03d}_0x.dds" if i % 2 else f"LEVEL{i % 3}/TEX{i:03d}.bin", ".dds" if i % 2 else ".bin")
+                  for i in range(64)]
+    return DatSearchIndex([DatCatalog("test.dat", m_Resolved)])
+
+class SearchKeystrokeTests(unittest.TestCase):
+    # Typing a query one key at a time must give the same results as searching for the final text on a fresh index.
+    SEQUENCES = ["0x12", "0x13", "hash:13", "hash:", "hash_0 ext:dds", "ext:dds hash_00", "0x1 level1"]
+
+    def test_keystrokes_match_fresh_index(self):
+        for sequence in SearchKeystrokeTests.SEQUENCES:
+            m_Index = make_index()
+            for end in range(1, len(sequence) + 1):
+                query = sequence[:end]
+                with self.subTest(query=query): self.assertEqual(m_Index.search(query), make_index().search(query))
+
+    def test_hash_prefix_after_name_word(self):
+        m_Index = make_index()
+        for query in ("0", "0x", "0x1"): m_Results = m_Index.search(query)
+        self.assertEqual(len(m_Results), 64)
+        self.assertEqual(len(m_Index.search("0x12")), 16)
+        for query in ("h", "ha", "has", "hash", "hash:", "hash:1"): m_Results = m_Index.search(query)
+        self.assertEqual(len(m_Results), 64)
+        self.assertEqual(len(m_Index.search("hash:13")), 16)
+
+if __name__ == "__main__":
+    unittest.main()